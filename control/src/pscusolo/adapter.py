@@ -6,14 +6,56 @@ Tim Nicholls & Harvey Wornham, STFC Detector Systems Software Group
 """
 import logging
 
-from odin.adapters.adapter import ApiAdapter, ApiAdapterResponse, request_types, response_types
+from odin.adapters.adapter import ApiAdapterResponse, request_types, response_types
+from odin.adapters.async_adapter import AsyncApiAdapter
 from odin.adapters.parameter_tree import ParameterTreeError
 from odin.util import decode_request_body
 
 from pscusolo.controller import PSCUSoloController
+from pscusolo.encoding import SnapshotEncoder
+from pscusolo.pscusolo import SCAN_CLASSES
 
 
-class PSCUSoloAdapter(ApiAdapter):
+def get_argument(request, name, arg_type=str, default=None):
+    """Get the value of a query argument of a request.
+
+    :param request: HTTP request object
+    :param name: name of the argument
+    :param arg_type: type to convert the argument value to
+    :param default: value to return if the argument is not present
+    :return: the last value given for the argument, converted to the specified type
+    """
+    values = request.query_arguments.get(name)
+    if not values:
+        return default
+
+    value = values[-1].decode('utf-8', errors='replace')
+    try:
+        return arg_type(value)
+    except ValueError:
+        raise ValueError("Invalid value for argument {}: {}".format(name, value))
+
+
+def accepts_packed(request):
+    """Determine whether a request selects the binary snapshot encoding.
+
+    The Accept header is split into media ranges as by the response_types decorator, and the
+    binary encoding is selected if it is listed ahead of JSON and of any wildcard range.
+
+    :param request: HTTP request object
+    :return: true if the binary snapshot encoding is selected
+    """
+    for media_range in request.headers.get('Accept', '').split(','):
+        media_type = media_range.split(';')[0].strip()
+        if media_type == SnapshotEncoder.CONTENT_TYPE:
+            return True
+        if media_type in ('application/json', 'application/*', '*/*'):
+            return False
+
+    return False
+
+
+class PSCUSoloAdapter(AsyncApiAdapter):
     """Main adapter class for the Hxtleak adapter."""
 
     def __init__(self, **kwargs):
@@ -27,36 +69,153 @@ class PSCUSoloAdapter(ApiAdapter):
 
         # Parse options
         # port_name = str(self.options.get('port_name', '/dev/ttyACM0'))
-
-        self.controller = PSCUSoloController()
+        bulk_read = bool(int(self.options.get('bulk_read', 1)))
+        scan_periods = {
+            scan: int(self.options['scan_period_{}'.format(scan)])
+            for scan in SCAN_CLASSES if 'scan_period_{}'.format(scan) in self.options
+        }
+
+        threaded = bool(int(self.options.get('threaded', 0)))
+        push_port = int(self.options.get('push_port', 0))
+        history_size = int(self.options.get('history_size', 14400))
+        history_file = str(self.options.get('history_file', ''))
+        history_file_size = int(self.options.get('history_file_size', 86400))
+        history_flush = float(self.options.get('history_flush', 60.0))
+        capture_pre = float(self.options.get('capture_pre', 30.0))
+        capture_post = float(self.options.get('capture_post', 10.0))
+        capture_period = int(self.options.get('capture_period', 50))
+        capture_count = int(self.options.get('capture_count', 8))
+        event_log_size = int(self.options.get('event_log_size', 4096))
+        fan_period_mode = bool(int(self.options.get('fan_period_mode', 1)))
+        fan_windows = (
+            int(self.options.get('fan_short_window', 5)),
+            int(self.options.get('fan_long_window', 10)),
+        )
+        stats_window = int(self.options.get('stats_window', 20))
+        fan_stall_factor = float(self.options.get('fan_stall_factor', 3.0))
+        fan_stall_min_time = float(self.options.get('fan_stall_min_time', 0.5))
+        fan_degraded_fraction = float(self.options.get('fan_degraded_fraction', 0.7))
+        fan_baseline_rpm = float(self.options.get('fan_baseline_rpm', 0)) or None
+
+        self.controller = PSCUSoloController(
+            bulk_read=bulk_read, scan_periods=scan_periods, threaded=threaded,
+            push_port=push_port, history_size=history_size, history_file=history_file,
+            history_file_size=history_file_size, history_flush=history_flush,
+            capture_pre=capture_pre, capture_post=capture_post, capture_period=capture_period,
+            capture_count=capture_count, event_log_size=event_log_size,
+            fan_period_mode=fan_period_mode, fan_windows=fan_windows, stats_window=stats_window,
+            fan_stall_factor=fan_stall_factor, fan_stall_min_time=fan_stall_min_time,
+            fan_degraded_fraction=fan_degraded_fraction, fan_baseline_rpm=fan_baseline_rpm
+        )
 
         logging.debug("PSCUSoloAdapter loaded")
 
-    @response_types('application/json', default='application/json')
-    def get(self, path, request):
+    @response_types('application/json', SnapshotEncoder.CONTENT_TYPE, default='application/json')
+    async def get(self, path, request):
         """Handle an HTTP GET request.
 
-        This method handles an HTTP GET request, returning a JSON response.
+        This method handles an HTTP GET request, returning a JSON response. If a since query
+        argument is given, only the signals that have changed after that snapshot sequence number
+        are returned, along with the current sequence number and epoch. As sequence numbers restart
+        with the adapter, a client passing the epoch of its since value with an epoch query
+        argument is sent all signals after a restart. Otherwise the JSON encoding of the
+        path is served from the controller, which caches those of the most requested paths.
+
+        Responses carry the ETag computed by tornado from their content, and a GET with a
+        matching If-None-Match header is answered with 304 Not Modified. As the encodings are
+        cached per snapshot, conditional and delta GETs from clients polling faster than the
+        update cycle cost little more than a lookup.
+
+        If a wait query argument is given, the request is a long-poll, answered when the next
+        snapshot is published or, if since is also given, when a signal under the path changes
+        after that snapshot, or after waiting for the given number of seconds.
+
+        A fields query argument selects a comma-separated list of paths relative to the path,
+        returning the leaves under them as a single sparse tree, and restricting the changes
+        returned by, or waited for by, since and wait queries.
+
+        Machine clients may instead accept the compact binary encoding of the whole snapshot,
+        described in the encoding module, by a GET of the root path, optionally with wait.
+
+        The recorded history is queried with a GET of history/samples, with optional start and
+        end timestamps, negative values being relative to now, a comma-separated list of signal
+        names and a raw flag selecting the ADC codes of the ADC signals. Long ranges are returned
+        in pages, flagged as truncated, the next starting at the last timestamp returned. The
+        downsampled minimum, mean and maximum over longer ranges are queried likewise with a GET
+        of history/trend, with an optional resolution in seconds. The snapshots captured around
+        a trip or latch are downloaded with a GET of capture/data, with the capture number and an
+        optional list of signal names. Transitions of the status signals are queried with a GET
+        of events/log, with optional start, end and signals.
 
         :param path: URI path of request
         :param request: HTTP request object
         :return: an ApiAdapterResponse object containing the appropriate response
         """
+        content_type = 'application/json'
+
         try:
-            response = self.controller.get(path)
+            since = get_argument(request, 'since', int)
+            epoch = get_argument(request, 'epoch')
+            wait = get_argument(request, 'wait', float)
+            fields = get_argument(request, 'fields')
+            if fields is not None:
+                fields = fields.split(',')
+            packed = accepts_packed(request)
+            if packed and (path.strip('/') or since is not None or fields is not None):
+                raise ValueError("Binary encoding is only supported for the full snapshot")
+            if path.strip('/') in (
+                self.controller.HISTORY_PATH, self.controller.TREND_PATH,
+                self.controller.CAPTURE_PATH, self.controller.EVENTS_PATH
+            ):
+                response = self.get_history(path.strip('/'), request)
+            else:
+                if wait is not None:
+                    await self.controller.wait(path, wait, since, fields, epoch)
+                if packed:
+                    response = self.controller.get_packed()
+                    content_type = SnapshotEncoder.CONTENT_TYPE
+                elif since is None and fields is None:
+                    response = self.controller.get_encoded(path)
+                else:
+                    response = self.controller.get(path, since, fields, epoch)
             status_code = 200
-        except (ParameterTreeError) as e:
+        except (ParameterTreeError, ValueError) as e:
             response = {'error': str(e)}
+            content_type = 'application/json'
             status_code = 400
 
-        content_type = 'application/json'
-
         return ApiAdapterResponse(response, content_type=content_type,
                                   status_code=status_code)
 
+    def get_history(self, path, request):
+        """Query the recorded, trend, captured or event history with the arguments of a request.
+
+        :param path: history query path
+        :param request: HTTP request object
+        :return: dict of the queried history
+        """
+        start = get_argument(request, 'start', float)
+        end = get_argument(request, 'end', float)
+        signals = get_argument(request, 'signals')
+        if signals is not None:
+            signals = signals.split(',')
+
+        if path == self.controller.CAPTURE_PATH:
+            number = get_argument(request, 'number', int)
+            if number is None:
+                raise ValueError("Capture number must be given")
+            return self.controller.get_capture(number, signals)
+        if path == self.controller.EVENTS_PATH:
+            return self.controller.get_events(start, end, signals)
+        if path == self.controller.TREND_PATH:
+            resolution = get_argument(request, 'resolution', float)
+            return self.controller.get_trend(start, end, resolution, signals)
+        raw = bool(get_argument(request, 'raw', int, 0))
+        return self.controller.get_history(start, end, signals, raw)
+
     @request_types('application/json', 'application/vnd.odin-native')
     @response_types('application/json', default='application/json')
-    def put(self, path, request):
+    async def put(self, path, request):
         """Handle an HTTP PUT request.
 
         This method handles an HTTP PUT request, decoding the request and attempting to set values
@@ -79,11 +238,11 @@ class PSCUSoloAdapter(ApiAdapter):
             response, content_type=content_type, status_code=status_code
         )
 
-    def cleanup(self):
+    async def cleanup(self):
         """Clean up the adapter.
 
         This method stops the background tasks, allowing the adapter state to be cleaned up
         correctly.
         """
         logging.debug("Cleanup called")
-        # self.controller.cleanup()
+        self.controller.cleanup()
@@ -0,0 +1,155 @@
+"""Trip and latch capture for the PSCUSolo.
+
+This module implements a pre- and post-trigger capture buffer for post-mortem analysis of trips.
+The last few seconds of snapshots are held continuously in a small pre-trigger history buffer.
+When a trigger signal, e.g. the tripped or a latched bit, goes active, the pre-trigger history
+is frozen into a new numbered capture, which goes on to record the snapshots of the post-trigger
+period. A trigger that goes active during the post-trigger period is added to the capture and
+extends the period, until the capture is full. The most recent captures are retained for
+download.
+
+The buffer only records the snapshots that are published anyway, so it adds no I2C load in the
+steady state. Its owner may speed up acquisition while a capture is active.
+
+STFC Detector Systems Software Group
+"""
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional
+
+from pscusolo.history import History
+
+
+class Capture:
+    """Capture of the snapshots around a trigger."""
+
+    __slots__ = ("number", "triggers", "timestamp", "end", "history")
+
+    def __init__(self, number: int, triggers: List[str], timestamp: float, end: float, history):
+        """Initialise the capture.
+
+        :param number: capture number
+        :param triggers: names of the trigger signals that went active, in order
+        :param timestamp: timestamp of the first triggering snapshot
+        :param end: timestamp after which the post-trigger period is complete
+        :param history: History instance holding the captured snapshots
+        """
+        self.number = number
+        self.triggers = triggers
+        self.timestamp = timestamp
+        self.end = end
+        self.history = history
+
+    def summary(self, complete: bool) -> Dict[str, object]:
+        """Return a summary of the capture.
+
+        :param complete: whether the post-trigger period of the capture is complete
+        """
+        return {
+            "number": self.number,
+            "triggers": list(self.triggers),
+            "timestamp": self.timestamp,
+            "samples": self.history.count,
+            "complete": complete,
+        }
+
+
+class CaptureBuffer:
+    """Pre- and post-trigger capture buffer class.
+
+    This class watches the trigger signals of each recorded PSCUSolo snapshot and captures the
+    snapshots around each time one of them goes active.
+    """
+
+    def __init__(
+        self, pscu, triggers: Iterable[str], pre_samples: int, post_samples: int,
+        post_time: float, max_captures: int
+    ):
+        """Initialise the capture buffer.
+
+        :param pscu: PSCUSolo instance whose state records are to be captured
+        :param triggers: names of the status signals that trigger a capture on going active
+        :param pre_samples: number of snapshots held ahead of a trigger
+        :param post_samples: maximum number of snapshots captured after a trigger
+        :param post_time: duration of the post-trigger period in seconds
+        :param max_captures: number of captures retained, the oldest being discarded
+        """
+        self.pscu = pscu
+        self.triggers = list(triggers)
+        self.trigger_offsets = [
+            pscu.layout[pscu.signal_index[name]][1] for name in self.triggers
+        ]
+        self.post_samples = post_samples
+        self.post_time = post_time
+
+        self.pre = History(pscu, pre_samples)
+        self.previous = bytearray(len(self.triggers))
+        self.captures: Deque[Capture] = deque(maxlen=max(1, max_captures))
+        self.active: Optional[Capture] = None
+        self.next_number = 1
+
+    def record(self, state) -> bool:
+        """Record a state record, starting or completing a capture as required.
+
+        Triggers are edge sensitive, so the first snapshot recorded does not trigger a capture
+        for signals that are already active. A trigger during the post-trigger period of the
+        active capture is added to it and restarts the post-trigger period, so that the capture
+        continues until the period after the last trigger is complete or the capture is full.
+
+        :param state: PSCUSoloState record to record
+        :return: true if a capture is active after recording the snapshot
+        """
+        self.pre.record(state)
+
+        fired = []
+        for (idx, offset) in enumerate(self.trigger_offsets):
+            value = state.status[offset]
+            if value and not self.previous[idx] and self.pre.count > 1:
+                fired.append(self.triggers[idx])
+            self.previous[idx] = value
+
+        if self.active:
+            self.active.history.record(state)
+            if fired:
+                self.active.triggers.extend(fired)
+                self.active.end = state.timestamp + self.post_time
+            if state.timestamp >= self.active.end or (
+                self.active.history.count == self.active.history.capacity
+            ):
+                self.active = None
+        elif fired:
+            history = History(self.pscu, self.pre.capacity + self.post_samples)
+            history.copy_from(self.pre)
+            self.active = Capture(
+                self.next_number, fired, state.timestamp, state.timestamp + self.post_time,
+                history
+            )
+            self.captures.append(self.active)
+            self.next_number += 1
+
+        return self.active is not None
+
+    def summaries(self) -> List[Dict[str, object]]:
+        """Return summaries of the retained captures, oldest first."""
+        return [capture.summary(capture is not self.active) for capture in self.captures]
+
+    def get(self, number: int) -> Capture:
+        """Return a retained capture.
+
+        :param number: capture number
+        """
+        for capture in self.captures:
+            if capture.number == number:
+                return capture
+        raise ValueError("No such capture: {}".format(number))
+
+    def query(self, number: int, names: Optional[Iterable[str]] = None) -> Dict[str, object]:
+        """Query the values of signals in a capture.
+
+        :param number: capture number
+        :param names: optional names of the signals to return, all signals if None
+        :return: dict of the capture summary and its sequence numbers, timestamps and values
+        """
+        capture = self.get(number)
+        result = capture.summary(capture is not self.active)
+        result.update(capture.history.query(names=names))
+        return result
@@ -6,113 +6,787 @@ inteface.
 
 Harvey Wornham, STFC Detector Systems Software Group
 """
+import json
 import logging
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from functools import partial
 
-from tornado.ioloop import PeriodicCallback
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.locks import Condition
 
-from odin.adapters.parameter_tree import ParameterTree
-from pscusolo.pscusolo import PSCUSolo
+from odin.adapters.parameter_tree import ParameterTree, ParameterTreeError
+from pscusolo.capture import CaptureBuffer
+from pscusolo.encoding import SnapshotEncoder
+from pscusolo.events import EventLog
+from pscusolo.gpio_fan_speed import RollingStats
+from pscusolo.history import History, TrendHistory
+from pscusolo.pscusolo import PSCUSolo, SCAN_CLASSES, SCAN_SLOW
+from pscusolo.push import PushServer
+from pscusolo.store import HistoryStore
+
+
+def build_tree(leaves):
+    """Build a nested parameter tree dict from a list of (path, leaf) pairs.
+
+    Path elements are separated by slashes. Nodes whose elements are all numeric become lists,
+    ordered by index.
+
+    :param leaves: iterable of (path, leaf) pairs
+    :return: nested dict suitable for creating a ParameterTree
+    """
+    tree = {}
+    for (path, leaf) in leaves:
+        elems = path.split("/")
+        node = tree
+        for elem in elems[:-1]:
+            node = node.setdefault(elem, {})
+        node[elems[-1]] = leaf
+
+    return _listify(tree)
+
+
+def build_sparse_tree(leaves):
+    """Build a sparse nested dict from a list of (path, value) pairs.
+
+    Unlike build_tree(), numeric path elements are kept as dict keys, so that a subset of the
+    elements of a list can be represented.
+
+    :param leaves: iterable of (path, value) pairs
+    :return: nested dict
+    """
+    tree = {}
+    for (path, value) in leaves:
+        elems = path.split("/")
+        node = tree
+        for elem in elems[:-1]:
+            node = node.setdefault(elem, {})
+        node[elems[-1]] = value
+
+    return tree
+
+
+def path_matches(leaf_path, path):
+    """Return true if a leaf path is equal to or below a tree path.
+
+    :param leaf_path: slash-separated path of a leaf
+    :param path: slash-separated tree path, empty for the root of the tree
+    """
+    return not path or leaf_path == path or leaf_path.startswith(path + "/")
+
+
+def paths_match(leaf_path, paths):
+    """Return true if a leaf path is equal to or below any of a list of tree paths.
+
+    :param leaf_path: slash-separated path of a leaf
+    :param paths: list of slash-separated tree paths
+    """
+    return any(path_matches(leaf_path, path) for path in paths)
+
+
+def _listify(node):
+    """Recursively convert dict nodes with numeric keys in a tree to lists."""
+    if not isinstance(node, dict):
+        return node
+
+    node = {key: _listify(value) for (key, value) in node.items()}
+    if node and all(key.isdigit() for key in node):
+        return [node[key] for key in sorted(node, key=int)]
+
+    return node
 
 
 class PSCUSoloController():
     """generates and updates the parameter tree."""
 
-    def __init__(self):
-        """Initalises the logging.debug command."""
+    SENSOR_NAMES = {
+        "temperature/sensors/0": "Internal",
+        "temperature/sensors/1": "Coolant",
+        "humidity/sensors/0": "Internal",
+        "leak/sensors/0": "Leak",
+        "pump/sensors/0": "Pump",
+        "fans/sensors/0": "Fan 1",
+        "fans/sensors/1": "Fan 2",
+    }
+
+    # Paths whose JSON encoding is cached and reused for as long as the snapshot is current
+    CACHED_PATHS = ("", "temperature", "humidity", "leak", "pump", "fans")
+
+    # Paths of history and trend time-range queries, which take arguments and so are not part of
+    # the tree
+    HISTORY_PATH = "history/samples"
+    TREND_PATH = "history/trend"
+    CAPTURE_PATH = "capture/data"
+    EVENTS_PATH = "events/log"
+
+    # Maximum number of signal values returned by a history query, i.e. a page of a couple of
+    # hundred snapshots of all signals
+    MAX_QUERY_VALUES = 10000
+
+    # Bucket period in seconds and capacity of each trend history tier, holding an hour of 1 s,
+    # a day of 1 min and 31 days of 15 min buckets
+    TREND_TIERS = ((1, 3600), (60, 1440), (900, 2976))
+
+    # Longest time in seconds a long-poll request may wait for a change
+    MAX_WAIT = 60.0
+
+    DEFAULT_SCAN_PERIODS = {
+        "fast": 250,
+        "normal": 250,
+        "slow": 5000,
+    }
+
+    def __init__(
+        self, bulk_read=True, scan_periods=None, threaded=False, push_port=0, history_size=14400,
+        history_file=None, history_file_size=86400, history_flush=60.0, capture_pre=30.0,
+        capture_post=10.0, capture_period=50, capture_count=8, event_log_size=4096,
+        fan_period_mode=True, fan_windows=(5, 10), stats_window=20, fan_stall_factor=3.0,
+        fan_stall_min_time=0.5, fan_degraded_fraction=0.7, fan_baseline_rpm=None
+    ):
+        """Initalises the logging.debug command.
+
+        :param bulk_read: read whole GPIO ports and ADC sequences once per update, not pin by pin
+        :param scan_periods: optional dict of update period in ms for each scan class
+        :param threaded: run the updates on a dedicated thread rather than on the IOLoop
+        :param push_port: port of the WebSocket push channel, which is disabled if zero
+        :param history_size: number of snapshots held in the history buffer
+        :param history_file: optional path of the persistent history file
+        :param history_file_size: number of snapshots held in the history file
+        :param history_flush: maximum time in seconds snapshots are batched before writing to
+                              the history file
+        :param capture_pre: time in seconds captured ahead of a trip or latch
+        :param capture_post: time in seconds captured after a trip or latch
+        :param capture_period: update period in ms while a capture is active
+        :param capture_count: number of captures retained
+        :param event_log_size: number of status transition events held in the event log
+        :param fan_period_mode: measure fan speeds from the intervals between tacho edges
+        :param fan_windows: numbers of samples in the short and long fan speed statistics windows
+        :param stats_window: number of snapshots in the rolling statistics window of each signal
+        :param fan_stall_factor: number of expected tacho pulse periods without an edge after which
+                                 a fan is stalled
+        :param fan_stall_min_time: minimum time in seconds without an edge after which a fan is
+                                   stalled, raised to at least two update periods
+        :param fan_degraded_fraction: fraction of the baseline speed below which a fan is degraded
+        :param fan_baseline_rpm: optional baseline fan speed, learnt from the measured speeds if
+                                 None
+        """
         logging.debug("Initalising PSCU solo controller")
 
+        # Resolve the scan period of each class. The update task runs at the shortest period, or
+        # the capture period while a capture is active, scanning each class as it falls due.
+        self.scan_periods = dict(self.DEFAULT_SCAN_PERIODS)
+        self.scan_periods.update(scan_periods or {})
+        self.base_interval = min(self.scan_periods[scan] for scan in SCAN_CLASSES)
+        self.capture_period = min(capture_period, self.base_interval)
+        self.boosted = False
+        self.update_task = None
+        self.set_update_interval(self.base_interval)
+        self.update_tick = 0
+
         # Create a PSCUSolo instance
-        self.pscu = PSCUSolo()
-
-        # Setup Parameter Tree
-        self.param_tree = ParameterTree({
-            "overall": (lambda: self.pscu.overall, None),
-            "latched": (lambda: self.pscu.latched, None),
-            "armed": (lambda: self.pscu.armed, self.pscu.set_armed),
-            "tripped": (lambda: self.pscu.tripped, None),
-            "temperature": {
-                "healthy": (lambda: self.pscu.temp_healthy, None),
-                "latched": (lambda: self.pscu.temp_latched, None),
-                "sensors": [
-                    {
-                        "sensor_name": "Internal",
-                        "trip_over": (lambda: self.pscu.temp1_trip_over, None),
-                        "trip_under": (lambda: self.pscu.temp1_trip_under, None),
-                        "temperature": (lambda: self.pscu.temp1, None),
-                        "setpoint_over": (lambda: self.pscu.temp1_sp_over, None),
-                        "setpoint_under": (lambda: self.pscu.temp1_sp_under, None),
-                    },
-                    {
-                        "sensor_name": "Coolant",
-                        "trip_over": (lambda: self.pscu.temp2_trip_over, None),
-                        "trip_under": (lambda: self.pscu.temp2_trip_under, None),
-                        "temperature": (lambda: self.pscu.temp2, None),
-                        "setpoint_over": (lambda: self.pscu.temp2_sp_over, None),
-                        "setpoint_under": (lambda: self.pscu.temp2_sp_under, None),
-                    }
-                ],
-            },
-            "humidity": {
-                "healthy": (lambda: self.pscu.humid_healthy, None),
-                "latched": (lambda: self.pscu.humid_latched, None),
-                "sensors": [
-                    {
-                        "sensor_name": "Internal",
-                        "trip_over": (lambda: self.pscu.humid_trip_over, None),
-                        "value": (lambda: self.pscu.humidity, None),
-                        "setpoint_over": (lambda: self.pscu.humid_sp, None),
-                    },
-                ]
-            },
-            "leak": {
-                "healthy": (lambda: self.pscu.leak_healthy, None),
-                "latched": (lambda: self.pscu.leak_latched, None),
-                "sensors": [
-                    {
-                        "sensor_name": "Leak",
-                        "trip_under": (lambda: self.pscu.leak_trip_under, None),
-                        "value": (lambda: self.pscu.leak, None),
-                        "setpoint_under": (lambda: self.pscu.leak_sp, None),
-                        "trace": (lambda: self.pscu.leak_trace, None),
-                    },
-                ]
-            },
-            "pump": {
-                "latched": (lambda: self.pscu.pump_latched, None),
-                "healthy": (lambda: self.pscu.pump_healthy, None),
-                "sensors": [
-                    {
-                        "sensor_name": "Pump",
-                        "pump_trip": (lambda: self.pscu.pump_trip, None),
-                    }
-                ]
-            },
-            "fans": {
-                "sensors": [
-                    {
-                        "sensor_name": "Fan 1",
-                        "value": (lambda: self.pscu.fans[0].rpm_5, None),
-                    },
-                    {
-                        "sensor_name": "Fan 2",
-                        "value": (lambda: self.pscu.fans[1].rpm_5, None),
-                    },
-                ]
-            }
-        })
-
-        self.update_task = PeriodicCallback(self.do_update, 250)
-        self.update_task.start()
-
-    def get(self, path):
-        """Update the parameter tree when a get command is called."""
+        self.pscu = PSCUSolo(
+            bulk_read=bulk_read, fan_period_mode=fan_period_mode, fan_windows=fan_windows,
+            fan_stall_factor=fan_stall_factor,
+            fan_stall_min_time=max(fan_stall_min_time, 2 * self.base_interval / 1000.0),
+            fan_degraded_fraction=fan_degraded_fraction, fan_baseline_rpm=fan_baseline_rpm
+        )
+
+        # Snapshot published by the last update. Each update fills a new state record, which is
+        # published on the IOLoop with a single reference swap and treated as immutable until it is
+        # superseded and released back to the pool. The tree only reads the current snapshot, so
+        # every request sees the values of one update, never an update in progress, and in
+        # threaded mode never waits on the I2C bus.
+        self.snapshot = self.pscu.snapshot()
+
+        # Identifier of this run of the controller, as sequence numbers restart with it, and the
+        # sequence number of the snapshot in which each signal last changed, used to answer delta
+        # queries. All signals, and the static sensor names, are taken to change in the first.
+        self.epoch = uuid.uuid4().hex
+        self.initial_seq = self.snapshot.seq
+        self.changed_seqs = array("Q", [self.initial_seq] * len(self.pscu.SIGNALS))
+        self.last_changed_seq = self.initial_seq
+        self.signal_offsets = [
+            [(offset, idx) for (idx, (is_status, offset, _)) in enumerate(self.pscu.layout)
+             if is_status == status]
+            for status in (False, True)
+        ]
+
+        # History of the published snapshots, starting with the initial one, and downsampled
+        # trend history of the analog signals in the tree
+        self.history = History(self.pscu, history_size)
+        self.history.record(self.snapshot)
+        self.trend = TrendHistory(
+            self.pscu,
+            [signal.name for (signal, (is_status, _, _)) in zip(self.pscu.SIGNALS, self.pscu.layout)
+             if signal.path and not is_status],
+            self.TREND_TIERS
+        )
+        self.trend.record(self.snapshot)
+
+        # Rolling statistics of the same analog signals over the most recent snapshots, updated
+        # incrementally as each is published
+        self.stats_window = stats_window
+        self.stats = [
+            (signal.name, offset, RollingStats(stats_window))
+            for (signal, (is_status, offset, _)) in zip(self.pscu.SIGNALS, self.pscu.layout)
+            if signal.path and not is_status
+        ]
+        self.record_stats(self.snapshot)
+
+        # Log of the transitions of the status signals between snapshots
+        self.events = EventLog(self.pscu, event_log_size)
+
+        # Capture buffer, triggered by the tripped and latched bits going active
+        self.capture = CaptureBuffer(
+            self.pscu,
+            [signal.name for (signal, (is_status, _, _)) in zip(self.pscu.SIGNALS, self.pscu.layout)
+             if is_status and (signal.name in ("tripped", "latched")
+                               or signal.name.endswith("_latched"))],
+            pre_samples=int(capture_pre * 1000 / self.base_interval) + 1,
+            post_samples=int(capture_post * 1000 / self.capture_period) + 1,
+            post_time=capture_post, max_captures=capture_count
+        )
+        self.capture.record(self.snapshot)
+
+        # Persistent history store, batching enough snapshots to cover the flush interval. Batches
+        # are copied into the file on publishing, then synced to the card on a worker thread, so
+        # that a slow card does not hold up the IOLoop.
+        self.store = None
+        self.store_executor = None
+        if history_file:
+            self.store_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="PSCUSoloHistory"
+            )
+            self.store = HistoryStore(
+                history_file, self.pscu, history_file_size,
+                batch_size=int(history_flush * 1000 / self.base_interval) + 1,
+                flush_interval=history_flush
+            )
+            self.record_store(self.snapshot)
+
+        # Start the push channel, which streams the changes in each published snapshot. Clients are
+        # only served once the IOLoop runs, by which time the tree below is complete.
+        self.push = PushServer(self, push_port) if push_port else None
+
+        # Binary encoder of snapshots, for machine clients
+        self.encoder = SnapshotEncoder(self.pscu)
+
+        # Compile the parameter tree from the signal table, adding the sensor names ahead of the
+        # first signal of each sensor. The flat lists of (path, signal index) and static (path,
+        # value) leaves are retained.
+        setters = {"armed": self.set_armed}
+        leaves = []
+        self.signal_leaves = []
+        self.static_leaves = []
+        for (idx, signal) in enumerate(self.pscu.SIGNALS):
+            if not signal.path:
+                continue
+            sensor = signal.path.rsplit("/", 1)[0]
+            if sensor in self.SENSOR_NAMES and (sensor + "/sensor_name") not in dict(leaves):
+                leaves.append((sensor + "/sensor_name", self.SENSOR_NAMES[sensor]))
+                self.static_leaves.append(leaves[-1])
+            getter = partial(self.get_value, idx)
+            leaves.append((signal.path, (getter, setters.get(signal.name))))
+            self.signal_leaves.append((signal.path, idx))
+
+        leaves.extend([
+            ("scan/mux_switches", (lambda: self.snapshot.mux_switches, None)),
+            ("scan/mux_switches_saved", (lambda: self.snapshot.mux_switches_saved, None)),
+            ("snapshot/epoch", self.epoch),
+            ("snapshot/seq", (lambda: self.snapshot.seq, None)),
+            ("snapshot/timestamp", (lambda: self.snapshot.timestamp, None)),
+            ("snapshot/layout/analog", self.encoder.layout()["analog"]),
+            ("snapshot/layout/status", self.encoder.layout()["status"]),
+        ])
+        leaves.extend(
+            ("scan/periods/" + scan, (lambda scan=scan: self.scan_periods[scan], None))
+            for scan in SCAN_CLASSES
+        )
+        leaves.extend([
+            ("history/capacity", (lambda: self.history.capacity, None)),
+            ("history/count", (lambda: self.history.count, None)),
+            ("history/memory", (lambda: self.history.memory + self.trend.memory, None)),
+            ("history/oldest", (lambda: self.history.oldest(), None)),
+            ("history/newest", (lambda: self.history.newest(), None)),
+        ])
+        leaves.extend([
+            ("history/file/path", history_file or ""),
+            ("history/file/capacity", (lambda: self.store.capacity if self.store else 0, None)),
+            ("history/file/count", (lambda: self.store.count if self.store else 0, None)),
+            ("history/file/written", (lambda: self.store.flushed_count if self.store else 0, None)),
+        ])
+        leaves.extend([
+            ("capture/active", (lambda: self.capture.active is not None, None)),
+            ("capture/next_number", (lambda: self.capture.next_number, None)),
+            ("capture/captures", (self.capture.summaries, None)),
+            ("capture/triggers", list(self.capture.triggers)),
+        ])
+        leaves.extend([
+            ("events/capacity", (lambda: self.events.capacity, None)),
+            ("events/count", (lambda: self.events.count, None)),
+            ("events/total", (lambda: self.events.total, None)),
+        ])
+        leaves.append(("stats/window", self.stats_window))
+        for (name, _, stats) in self.stats:
+            leaves.extend(
+                ("stats/signals/{}/{}".format(name, stat),
+                 (lambda stats=stats, stat=stat: getattr(stats, stat), None))
+                for stat in ("mean", "std", "min", "max", "ewma")
+            )
+        for (idx, tier) in enumerate(self.trend.tiers):
+            leaves.extend([
+                ("history/tiers/{}/period".format(idx), tier.period),
+                ("history/tiers/{}/capacity".format(idx), tier.capacity),
+                ("history/tiers/{}/count".format(idx), (lambda tier=tier: tier.count, None)),
+            ])
+        leaves.extend([
+            ("push/port", (lambda: self.push.port if self.push else 0, None)),
+            ("push/clients", (lambda: len(self.push.clients) if self.push else 0, None)),
+        ])
+
+        # Getters of all the leaves, used to select fields, and the paths of all the leaves and
+        # nodes of the tree, used to validate query paths
+        self.leaf_getters = [
+            (path, leaf[0] if isinstance(leaf, tuple) else (lambda leaf=leaf: leaf))
+            for (path, leaf) in leaves
+        ]
+        self.tree_paths = {
+            "/".join(path.split("/")[:depth])
+            for (path, _) in leaves for depth in range(path.count("/") + 2)
+        }
+        self.param_tree = ParameterTree(build_tree(leaves))
+
+        # Cache of ((snapshot sequence number, live leaf version), JSON encoding) for each of the
+        # cached paths, and of the binary encoding of the current snapshot. The version counts
+        # changes to the leaves not held in the snapshot, e.g. the number of push clients.
+        self.encoded = {}
+        self.live_version = 0
+        self.packed = (None, b"")
+
+        # Condition notified when a snapshot is published, awaited by long-poll requests
+        self.published = Condition()
+
+        # Start the updates, either on a dedicated thread, which publishes the results back to
+        # the IOLoop and executes commands queued by requests, or as a periodic IOLoop callback
+        self.ioloop = IOLoop.current()
+        self.threaded = threaded
+        if self.threaded:
+            self.commands = queue.SimpleQueue()
+            self.update_stop = threading.Event()
+            self.update_thread = threading.Thread(
+                target=self.update_loop, name="PSCUSoloUpdate", daemon=True
+            )
+            self.update_thread.start()
+        else:
+            self.update_task = PeriodicCallback(self.do_update, self.update_interval)
+            self.update_task.start()
+
+    def get(self, path, since=None, fields=None, epoch=None):
+        """Update the parameter tree when a get command is called.
+
+        :param path: path to get
+        :param since: optional snapshot sequence number, to only get signals changed after it
+        :param fields: optional list of paths relative to path, to only get the leaves under them
+        :param epoch: optional epoch the since sequence number belongs to
+        """
+        if since is not None:
+            return self.get_delta(path, since, fields, epoch)
+        if fields is not None:
+            return self.get_fields(path, fields)
         return self.param_tree.get(path)
 
+    def field_paths(self, path, fields=None):
+        """Resolve and validate the tree paths selected by a query.
+
+        :param path: path of the query
+        :param fields: optional list of paths relative to path, empty elements being ignored
+        :return: list of selected paths
+        """
+        path = path.strip("/")
+        paths = [path]
+        if fields is not None:
+            paths = [
+                "/".join(elem for elem in (path, field.strip("/")) if elem)
+                for field in fields if field.strip("/")
+            ]
+
+        for field_path in paths:
+            if field_path not in self.tree_paths:
+                raise ParameterTreeError("Invalid path: {}".format(field_path))
+
+        return paths
+
+    def get_fields(self, path, fields):
+        """Get the leaves under a set of fields of a path.
+
+        The values of the selected leaves are collected in a single pass over the leaves and
+        returned as a sparse tree rooted at the top of the parameter tree, in which list elements
+        are keyed by index.
+
+        :param path: path to get
+        :param fields: list of paths relative to path
+        :return: sparse tree of selected values
+        """
+        paths = self.field_paths(path, fields)
+        return build_sparse_tree(
+            (leaf_path, getter()) for (leaf_path, getter) in self.leaf_getters
+            if paths_match(leaf_path, paths)
+        )
+
+    async def wait(self, path, timeout, since=None, fields=None, epoch=None):
+        """Wait for a new snapshot to be published, or for a signal under a path to change.
+
+        Without since, this waits for the next snapshot to be published. With since, it waits
+        until a signal under the path has changed after that snapshot, returning immediately if
+        one already has. Waiting requests are suspended on the IOLoop rather than holding a
+        thread, and return when the timeout, limited to MAX_WAIT, expires without a change.
+
+        :param path: path to wait for changes under
+        :param timeout: time to wait in seconds
+        :param since: optional snapshot sequence number to wait for changes after
+        :param fields: optional list of paths relative to path to wait for changes under
+        :param epoch: optional epoch the since sequence number belongs to
+        """
+        self.field_paths(path, fields)
+
+        deadline = self.ioloop.time() + min(self.MAX_WAIT, max(0.0, timeout))
+        seq = self.snapshot.seq
+
+        def changed():
+            if since is None:
+                return self.snapshot.seq != seq
+            return bool(self.get_delta(path, since, fields, epoch)["values"])
+
+        while not changed():
+            if not await self.published.wait(timeout=deadline):
+                break
+
+    def get_encoded(self, path):
+        """Get the values under a path encoded as JSON.
+
+        The encodings of the full tree and the top-level sensor subtrees are cached, so that
+        the tree is walked and encoded at most once per snapshot, however many clients request
+        them. Other paths are encoded on each request. As the full tree also holds leaves that
+        are not held in the snapshot, the cache is invalidated when any of those change.
+
+        :param path: path to get
+        :return: JSON encoded string
+        """
+        path = path.strip("/")
+        if path not in self.CACHED_PATHS:
+            return json.dumps(self.param_tree.get(path))
+
+        key = (self.snapshot.seq, self.live_version)
+        cached = self.encoded.get(path)
+        if cached is None or cached[0] != key:
+            cached = (key, json.dumps(self.param_tree.get(path)))
+            self.encoded[path] = cached
+
+        return cached[1]
+
+    def invalidate_encoded(self):
+        """Invalidate the cached encodings after a change to a leaf not held in the snapshot."""
+        self.live_version += 1
+
+    def get_history(self, start=None, end=None, names=None, raw=False):
+        """Get the recorded values of signals over a time range.
+
+        Negative start and end times are taken to be relative to the timestamp of the current
+        snapshot, e.g. a start of -60 selects the last minute. Ranges with a start before the
+        oldest snapshot in the in-memory history are answered from the history file, if there
+        is one. Either way, the result is limited to MAX_QUERY_VALUES values, i.e. a page of
+        fewer snapshots the more signals are selected, so that a long range cannot hold up the
+        IOLoop. Truncated results are flagged as such, and the next page is queried by starting
+        at the timestamp of the last snapshot returned.
+
+        The raw codes of the ADC signals are only recorded in the in-memory history, which
+        answers all queries for them.
+
+        :param start: optional start of the range, from the oldest recorded snapshot if None
+        :param end: optional end of the range, to the newest recorded snapshot if None
+        :param names: optional list of signal names, all signals if None
+        :param raw: return the ADC codes of ADC signals rather than their converted values
+        :return: dict of lists of the sequence numbers, timestamps and signal values, and the
+                 truncated flag
+        """
+        (start, end) = (self.resolve_time(start), self.resolve_time(end))
+        num_names = len(names) if names is not None else len(self.pscu.SIGNALS)
+        limit = max(1, self.MAX_QUERY_VALUES // max(1, num_names))
+
+        if self.store and not raw and start is not None and start < self.history.oldest():
+            return self.store.query(start, end, names, limit)
+        return self.history.query(start, end, names, limit, raw)
+
+    def get_trend(self, start=None, end=None, resolution=None, names=None):
+        """Get the downsampled minimum, mean and maximum of signals over a time range.
+
+        The trend history tier is selected to match the range and resolution, as described in
+        TrendHistory.select_tier(). Negative start and end times are relative to now, as for
+        get_history().
+
+        :param start: optional start of the range, from the oldest bucket if None
+        :param end: optional end of the range, to the current bucket if None
+        :param resolution: optional longest bucket period in seconds
+        :param names: optional list of signal names, all signals in the trend history if None
+        :return: dict of the bucket period and lists of bucket start times, counts and values
+        """
+        return self.trend.query(
+            self.resolve_time(start), self.resolve_time(end), resolution, names
+        )
+
+    def resolve_time(self, time_):
+        """Resolve a query time, negative times being relative to the current snapshot.
+
+        :param time_: timestamp or negative offset in seconds, or None
+        """
+        if time_ is not None and time_ < 0:
+            return self.snapshot.timestamp + time_
+        return time_
+
+    def get_events(self, start=None, end=None, names=None):
+        """Get the transitions of status signals over a time range.
+
+        Negative start and end times are relative to now, as for get_history().
+
+        :param start: optional start of the range, from the oldest event if None
+        :param end: optional end of the range, to the newest event if None
+        :param names: optional list of status signal names, all status signals if None
+        :return: dict of lists of the sequence number, timestamp, signal and value of each event
+        """
+        return self.events.query(self.resolve_time(start), self.resolve_time(end), names)
+
+    def get_capture(self, number, names=None):
+        """Get the recorded values of signals in a capture.
+
+        :param number: capture number
+        :param names: optional list of signal names, all signals if None
+        :return: dict of the capture summary and lists of its sequence numbers, timestamps and
+                 signal values
+        """
+        return self.capture.query(number, names)
+
+    def get_packed(self):
+        """Get the binary encoding of the current snapshot.
+
+        The encoding is cached, so that each snapshot is encoded at most once.
+
+        :return: encoded bytes, laid out as given by the snapshot/layout subtree
+        """
+        snapshot = self.snapshot
+        if self.packed[0] != snapshot.seq:
+            self.packed = (snapshot.seq, self.encoder.encode(snapshot))
+
+        return self.packed[1]
+
+    def get_delta(self, path, since, fields=None, epoch=None):
+        """Get the signals under a path that have changed since a snapshot.
+
+        The changed signals are returned as a sparse tree rooted at the top of the parameter tree,
+        in which list elements are keyed by index, along with the current sequence number to pass
+        as since in the next query and the epoch it belongs to. Leaves other than signals and
+        sensor names, e.g. the scan statistics, are not included. As sequence numbers restart
+        with the adapter, all signals are returned if the epoch given differs from the current
+        one, or if since is later than the current sequence number. A client that is up to date,
+        e.g. polling faster than the update cycle, is answered without visiting the signals.
+
+        :param path: path to get
+        :param since: snapshot sequence number
+        :param fields: optional list of paths relative to path, to only get the signals under them
+        :param epoch: optional epoch the since sequence number belongs to
+        :return: dict of the current epoch and sequence number and the sparse tree of changed
+                 values
+        """
+        paths = self.field_paths(path, fields)
+
+        snapshot = self.snapshot
+        if since > snapshot.seq or (epoch is not None and epoch != self.epoch):
+            since = 0
+        elif since >= self.last_changed_seq:
+            return {"epoch": self.epoch, "seq": snapshot.seq, "values": {}}
+
+        leaves = []
+        if since < self.initial_seq:
+            leaves.extend(
+                (leaf_path, value) for (leaf_path, value) in self.static_leaves
+                if paths_match(leaf_path, paths)
+            )
+        leaves.extend(
+            (leaf_path, self.pscu.state_value(snapshot, idx))
+            for (leaf_path, idx) in self.signal_leaves
+            if self.changed_seqs[idx] > since and paths_match(leaf_path, paths)
+        )
+
+        return {"epoch": self.epoch, "seq": snapshot.seq, "values": build_sparse_tree(leaves)}
+
     def set(self, path, data):
         """Update the parameter tree when a set command is called."""
         self.param_tree.set(path, data)
         return self.param_tree.get(path)
 
+    def cleanup(self):
+        """Stop the background updates."""
+        if self.threaded:
+            self.update_stop.set()
+            self.update_thread.join()
+        else:
+            self.update_task.stop()
+
+        if self.push:
+            self.push.stop()
+
+        if self.store:
+            self.store_executor.shutdown(wait=True)
+            self.store.close()
+
+    def get_value(self, idx):
+        """Return the value of a signal in the current snapshot."""
+        return self.pscu.state_value(self.snapshot, idx)
+
+    def set_armed(self, arm):
+        """Arm or disarm the PSCU.
+
+        In threaded mode the command is queued for the update thread and the armed state is
+        updated with the next published snapshot.
+
+        :param arm: arm if true, otherwise disarm
+        """
+        if self.threaded:
+            self.commands.put(partial(self.pscu.set_armed, arm))
+        else:
+            self.pscu.set_armed(arm)
+            self.publish(self.pscu.snapshot())
+
+    def publish(self, snapshot):
+        """Publish a snapshot as the current state, releasing the one it supersedes.
+
+        The signals that differ between the two snapshots are marked as changed in the new one,
+        status transitions are logged, the snapshot is recorded in the history, the changes are
+        pushed to any push channel clients and waiting long-poll requests are woken.
+
+        :param snapshot: PSCUSoloState record to publish
+        """
+        (previous, self.snapshot) = (self.snapshot, snapshot)
+        if previous is snapshot:
+            return
+
+        for (values, previous_values, offsets) in (
+            (snapshot.analog, previous.analog, self.signal_offsets[0]),
+            (snapshot.status, previous.status, self.signal_offsets[1]),
+        ):
+            if values != previous_values:
+                for (offset, idx) in offsets:
+                    if values[offset] != previous_values[offset]:
+                        self.changed_seqs[idx] = snapshot.seq
+                        self.last_changed_seq = snapshot.seq
+
+        self.events.record(previous, snapshot)
+        self.pscu.release_state(previous)
+        self.history.record(snapshot)
+        self.trend.record(snapshot)
+        self.record_stats(snapshot)
+        if self.capture.record(snapshot) != self.boosted:
+            self.boosted = not self.boosted
+            self.set_update_interval(self.capture_period if self.boosted else self.base_interval)
+        if self.store:
+            self.record_store(snapshot)
+
+        if self.push:
+            self.push.publish(snapshot)
+
+        self.published.notify_all()
+
+    def record_store(self, snapshot):
+        """Record a snapshot in the history file, writing and syncing the batch when due.
+
+        :param snapshot: PSCUSoloState record to record
+        """
+        if self.store.record_state(snapshot):
+            self.store_executor.submit(
+                self.sync_store, self.store.write_batch(snapshot.timestamp)
+            )
+
+    def sync_store(self, count):
+        """Sync the records written to the history file, on the history worker thread.
+
+        :param count: number of the next record after those to sync
+        """
+        try:
+            self.store.sync(count)
+        except Exception:
+            logging.exception("Error syncing history file")
+
+    def record_stats(self, snapshot):
+        """Append the values of the analog signals in a snapshot to their rolling statistics.
+
+        :param snapshot: PSCUSoloState record to record
+        """
+        analog = snapshot.analog
+        for (_, offset, stats) in self.stats:
+            stats.append(analog[offset])
+
+    def update_loop(self):
+        """Run the updates on the update thread until stopped.
+
+        Queued commands are executed ahead of each update. Updates are scheduled on a monotonic
+        clock; if an update overruns, the missed ticks are skipped rather than run back to back.
+        """
+        next_time = time.monotonic()
+
+        while not self.update_stop.is_set():
+            try:
+                while True:
+                    try:
+                        command = self.commands.get_nowait()
+                    except queue.Empty:
+                        break
+                    command()
+                self.do_update()
+            except Exception:
+                logging.exception("Error during PSCUSolo update")
+
+            next_time += self.update_interval / 1000.0
+            now = time.monotonic()
+            if next_time < now:
+                next_time = now
+            self.update_stop.wait(next_time - now)
+
+    def set_update_interval(self, interval):
+        """Set the update interval and the number of ticks between the scans of each class.
+
+        At the base interval, each class is scanned on every Nth tick, N being its period rounded
+        to whole ticks. While a capture is active, the interval is shortened and all classes but
+        the slow one are scanned on every tick.
+
+        :param interval: update interval in ms
+        """
+        self.update_interval = interval
+        self.scan_divisors = {
+            scan: max(1, round(self.scan_periods[scan] / interval))
+            if not self.boosted or scan == SCAN_SLOW else 1
+            for scan in SCAN_CLASSES
+        }
+        if self.update_task:
+            self.update_task.callback_time = interval
+
     def do_update(self):
-        """Run the update method from PSCUsolo.py."""
-        self.pscu.update()
+        """Run the update method from PSCUsolo.py for the scan classes due on this tick.
+
+        The PSCUSolo instance scans all classes when created, so the first tick only scans the
+        classes that are due every tick. The results are published directly or, when called on
+        the update thread, via a callback on the IOLoop. Commands queued for the update thread
+        have already run, so their effects are included.
+        """
+        self.update_tick += 1
+        scans = [
+            scan for scan in SCAN_CLASSES if (self.update_tick % self.scan_divisors[scan]) == 0
+        ]
+        self.pscu.update(scans)
+
+        if self.threaded:
+            self.ioloop.add_callback(self.publish, self.pscu.snapshot())
+        else:
+            self.publish(self.pscu.snapshot())
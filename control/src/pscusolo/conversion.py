@@ -0,0 +1,169 @@
+"""ADC conversions for the PSCUSolo.
+
+This module implements the conversion of 12-bit AD5593R ADC codes into the engineering values of
+the PSCUSolo sensors. Each conversion is available as a scalar function, as a lookup table
+precomputed over all codes, as used by the live acquisition, and as a vectorised function of numpy
+arrays of codes for bulk processing of recorded data. The module has no hardware dependencies, so
+it can be used off-target; numpy is only required for the array functions.
+
+STFC Detector Systems Software Group
+"""
+import math
+from array import array
+from types import ModuleType
+from typing import Callable, Dict, Optional
+
+np: Optional[ModuleType]
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Number of codes of the 12-bit AD5593R ADCs
+ADC_CODES = 4096
+
+# Cache of lookup tables keyed by conversion function
+_luts: Dict[Callable, array] = {}
+
+
+def temp1_adc(adc_val):
+    """Calculate temp1 value from ADC chip."""
+    temp1 = ((adc_val / 4095.)*218.75 - 66.875)
+    return temp1
+
+
+def temp1_raw_adc(adc_val):
+    """Calculate temp1 raw value from ADC chip."""
+    temp1 = (adc_val / 4095.)
+    return temp1
+
+
+def temp2_adc(adc_val):
+    """Calculate temp2 value from ADC chip."""
+    a = 1.039e-3
+    b = 2.354e-4
+    c = 1.939e-7
+    r = (40950000.0 / adc_val) - 10000
+    temp2 = (1.0 / (a + b * math.log(r) + c * (math.log(r)**3))) - 273.15
+    return temp2
+
+
+def temp2_raw_adc(adc_val):
+    """Calculate temp2 raw value from ADC chip."""
+    temp2 = (adc_val / 4095.)
+    return temp2
+
+
+def humid_adc(adc_val):
+    """Calculate humidity value from ADC chip."""
+    humid = ((adc_val / 4095.)*125.0) - 12.5
+    return humid
+
+
+def humid_raw_adc(adc_val):
+    """Calculate humidity raw value from ADC chip."""
+    humid = (adc_val / 4095.)
+    return humid
+
+
+def leak_adc(adc_val):
+    """Calculate leak value from ADC chip."""
+    leak = ((adc_val / 4095.)*5) / 150e-3
+    return leak
+
+
+def build_lut(conversion):
+    """Build a lookup table of a conversion function over all ADC codes.
+
+    Codes for which the conversion is undefined, e.g. 0 and 4095 for temp2, where the thermistor
+    is open or shorted, take the value of the nearest code for which it is defined, i.e. the
+    table saturates at its ends.
+
+    :param conversion: conversion function taking an ADC code
+    :return: array of converted values indexed by ADC code
+    """
+    values = [None] * ADC_CODES
+    for code in range(ADC_CODES):
+        try:
+            values[code] = float(conversion(code))
+        except (ValueError, ZeroDivisionError):
+            pass
+
+    defined = [code for code in range(ADC_CODES) if values[code] is not None]
+    for code in range(ADC_CODES):
+        if values[code] is None:
+            values[code] = values[min(defined, key=lambda defined_code: abs(defined_code - code))]
+
+    return array("d", values)
+
+
+def get_lut(conversion):
+    """Return the lookup table of a conversion function, building it on first use.
+
+    :param conversion: conversion function taking an ADC code
+    :return: array of converted values indexed by ADC code
+    """
+    lut = _luts.get(conversion)
+    if lut is None:
+        lut = build_lut(conversion)
+        _luts[conversion] = lut
+    return lut
+
+
+def lookup(lut, adc_val):
+    """Convert an ADC code with a lookup table, clamping out-of-range codes to the table ends."""
+    return lut[min(max(int(adc_val), 0), ADC_CODES - 1)]
+
+
+def convert_array(conversion, adc_vals):
+    """Convert an array of ADC codes with a conversion function in one vectorised pass.
+
+    The codes are used to index the lookup table of the conversion, so the results are identical
+    to those of the live acquisition, including the saturation of codes where the conversion is
+    undefined. Out-of-range codes are clamped to the table ends. This requires numpy.
+
+    :param conversion: conversion function taking an ADC code
+    :param adc_vals: array-like of integer ADC codes, of any shape
+    :return: numpy array of converted values with the same shape as adc_vals
+    """
+    if np is None:
+        raise ImportError("numpy is required for array conversions")
+
+    lut = np.frombuffer(get_lut(conversion), dtype=np.float64)
+    codes = np.asarray(adc_vals).astype(np.intp, copy=False)
+    return np.take(lut, codes, mode="clip")
+
+
+def temp1_adc_array(adc_vals):
+    """Calculate temp1 values from an array of ADC codes."""
+    return convert_array(temp1_adc, adc_vals)
+
+
+def temp1_raw_adc_array(adc_vals):
+    """Calculate temp1 raw values from an array of ADC codes."""
+    return convert_array(temp1_raw_adc, adc_vals)
+
+
+def temp2_adc_array(adc_vals):
+    """Calculate temp2 values from an array of ADC codes."""
+    return convert_array(temp2_adc, adc_vals)
+
+
+def temp2_raw_adc_array(adc_vals):
+    """Calculate temp2 raw values from an array of ADC codes."""
+    return convert_array(temp2_raw_adc, adc_vals)
+
+
+def humid_adc_array(adc_vals):
+    """Calculate humidity values from an array of ADC codes."""
+    return convert_array(humid_adc, adc_vals)
+
+
+def humid_raw_adc_array(adc_vals):
+    """Calculate humidity raw values from an array of ADC codes."""
+    return convert_array(humid_raw_adc, adc_vals)
+
+
+def leak_adc_array(adc_vals):
+    """Calculate leak values from an array of ADC codes."""
+    return convert_array(leak_adc, adc_vals)
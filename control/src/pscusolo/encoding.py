@@ -0,0 +1,67 @@
+"""Compact binary encoding of PSCUSolo snapshots.
+
+This module implements a fixed binary layout for PSCUSolo state records, for machine clients
+polling many units, which is far smaller and cheaper to produce and decode than the JSON tree.
+The layout is derived from the PSCUSolo signal table. All fields are little-endian:
+
+    header:  uint16 number of analog values, uint16 number of status values,
+             uint64 snapshot sequence number, float64 snapshot timestamp
+    analog:  one float32 per analog signal, in signal table order
+    status:  one bit per status signal, in signal table order, packed LSB first into bytes
+
+The names of the analog and status signals, in order, are given by the layout() method and
+published in the parameter tree, so that clients can decode the values without knowledge of the
+signal table.
+
+STFC Detector Systems Software Group
+"""
+import struct
+from typing import Dict, List
+
+
+class SnapshotEncoder:
+    """Binary snapshot encoder class.
+
+    This class packs the values of PSCUSolo state records into the fixed binary layout described
+    above.
+    """
+
+    CONTENT_TYPE = "application/vnd.pscusolo.snapshot"
+
+    HEADER = struct.Struct("<HHQd")
+
+    def __init__(self, pscu):
+        """Initialise the encoder for the signal layout of a PSCUSolo instance.
+
+        :param pscu: PSCUSolo instance whose state records are to be encoded
+        """
+        self.analog_names: List[str] = []
+        self.status_names: List[str] = []
+        for (signal, (is_status, _, _)) in zip(pscu.SIGNALS, pscu.layout):
+            (self.status_names if is_status else self.analog_names).append(signal.name)
+
+        self.analog = struct.Struct("<{}f".format(len(self.analog_names)))
+        self.status_bytes = (len(self.status_names) + 7) // 8
+
+    def layout(self) -> Dict[str, List[str]]:
+        """Return the names of the analog and status signals, in encoded order."""
+        return {"analog": list(self.analog_names), "status": list(self.status_names)}
+
+    def encode(self, state) -> bytes:
+        """Encode a state record.
+
+        :param state: PSCUSoloState record to encode
+        :return: encoded bytes
+        """
+        bits = 0
+        for (bit, value) in enumerate(state.status):
+            if value:
+                bits |= 1 << bit
+
+        return b"".join((
+            self.HEADER.pack(
+                len(self.analog_names), len(self.status_names), state.seq, state.timestamp
+            ),
+            self.analog.pack(*state.analog),
+            bits.to_bytes(self.status_bytes, "little"),
+        ))
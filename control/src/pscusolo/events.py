@@ -0,0 +1,103 @@
+"""Status transition event log for the PSCUSolo.
+
+This module implements a bounded log of the transitions of the PSCUSolo status signals, i.e. the
+GPIO input bits and the logic derived from them. Each published snapshot is compared with the
+previous one and a timestamped event is appended for each status signal that has changed, so
+that short glitches remain visible after the fact. The log is held in preallocated arrays used
+as a ring buffer, overwriting the oldest events when full.
+
+STFC Detector Systems Software Group
+"""
+from array import array
+from typing import Dict, Iterable, Optional
+
+from pscusolo.ring import RingBuffer
+
+
+class EventLog(RingBuffer):
+    """Status transition event log class.
+
+    This class records the transitions of the status signals between successive PSCUSolo state
+    records and answers queries of the events of selected signals over a time range.
+    """
+
+    def __init__(self, pscu, capacity: int):
+        """Initialise the event log.
+
+        :param pscu: PSCUSolo instance whose state records are to be compared
+        :param capacity: number of events to hold
+        """
+        super().__init__(capacity)
+
+        # Names of the status signals, indexed by state record offset
+        self.names = [
+            signal.name for (signal, (is_status, _, _)) in zip(pscu.SIGNALS, pscu.layout)
+            if is_status
+        ]
+
+        self.seqs = array("Q", bytes(8 * self.capacity))
+        self.timestamps = array("d", bytes(8 * self.capacity))
+        self.offsets = array("H", bytes(2 * self.capacity))
+        self.values = bytearray(self.capacity)
+
+        # Total number of events recorded
+        self.total = 0
+
+    def record(self, previous, state) -> None:
+        """Record an event for each status signal that differs between two state records.
+
+        :param previous: previous PSCUSoloState record
+        :param state: new PSCUSoloState record
+        """
+        if state.status == previous.status:
+            return
+
+        for (offset, (old, new)) in enumerate(zip(previous.status, state.status)):
+            if old != new:
+                slot = self.advance()
+                self.seqs[slot] = state.seq
+                self.timestamps[slot] = state.timestamp
+                self.offsets[slot] = offset
+                self.values[slot] = new
+                self.total += 1
+
+    def time_at(self, slot: int) -> float:
+        """Return the timestamp of the event in a slot.
+
+        :param slot: buffer slot of the event
+        """
+        return self.timestamps[slot]
+
+    def query(
+        self, start: Optional[float] = None, end: Optional[float] = None,
+        names: Optional[Iterable[str]] = None
+    ) -> Dict[str, list]:
+        """Query the events of signals over a time range.
+
+        :param start: optional timestamp of the start of the range, from the oldest if None
+        :param end: optional timestamp of the end of the range, to the newest if None
+        :param names: optional names of the signals to return events of, all signals if None
+        :return: dict of lists of the sequence number, timestamp, signal name and new value of
+                 each event in the range, oldest first
+        """
+        offsets = None
+        if names is not None:
+            offsets = set()
+            for name in names:
+                if name not in self.names:
+                    raise ValueError("Unknown status signal: {}".format(name))
+                offsets.add(self.names.index(name))
+
+        first = self.bisect(start) if start is not None else 0
+        last = self.bisect(end, after=True) if end is not None else self.count
+        slots = [
+            slot for slot in (self.slot(idx) for idx in range(first, last))
+            if offsets is None or self.offsets[slot] in offsets
+        ]
+
+        return {
+            "seq": [self.seqs[slot] for slot in slots],
+            "timestamp": [self.timestamps[slot] for slot in slots],
+            "signal": [self.names[self.offsets[slot]] for slot in slots],
+            "value": [bool(self.values[slot]) for slot in slots],
+        }
@@ -4,49 +4,184 @@ This module implements classes to measure PSCUsolo fan speeds via GPIO input pin
 tachometer output of the fan. This is implemented via the event detection mechanism provided by the
 Adafruit_BBIO GPIO class. A callback counts rising edges on the tacho input - a periodic call to
 the update() method calculates the the instantaneous and rolling mean freqeuency of the pulese.
-Methods convert these to RPM assuming the typical 2 tacho pulses per revolution.
+Methods convert these to RPM assuming the typical 2 tacho pulses per revolution. The rolling
+statistics are calculated incrementally by a streaming statistics class, which can equally be used
+for any other periodically sampled value.
+
+A fan is flagged as stalled as soon as no edge has been detected within a multiple of the pulse
+period expected at its baseline speed, or a minimum time if that is longer, and as degraded when
+its speed has remained below a fraction of the baseline for the whole of the long statistics
+window. The baseline is either specified or learnt as the highest long window mean speed observed.
+
+In period measurement mode, the callback also records a monotonic timestamp of each edge in a
+small ring buffer, and the instantaneous frequency is calculated from the intervals between the
+most recent edges rather than from the edge count over the update period, so that it follows
+changes in speed within a few pulses and is not quantised at low speeds.
 
 Tim Nicholls, STFC Detector System Software Group
 """
+import math
+import threading
 import time
+from array import array
 from collections import deque
-from typing import Optional
+from typing import Deque, Dict, Iterator, Optional, Tuple
 
 import Adafruit_BBIO.GPIO as GPIO
 
 
-class RollingMean(deque):
-    """Simple rolling mean class.
+class RollingStats:
+    """Streaming rolling statistics class.
 
-    This class implements a simple rolling mean calculation for a specified number of samples.
-    Based on the standard deque, new values can simply be append()-ed to the object, and the mean
-    is calculated based on the number of samples held, i.e. is valid for the first n samples before
-    the deque is filled. Successive append() calls will remove the oldest value from the deque.
+    This class implements rolling statistics over a specified number of samples, for use with any
+    periodically sampled value. New values are append()-ed to the object, which updates the
+    running mean and variance (using Welford's method, extended to remove the oldest sample once
+    the window is full), an exponentially weighted moving average and the window minimum and
+    maximum (using monotonic deques) in constant time. The statistics are valid for the first n
+    samples before the window is filled and are returned as zero before any value is appended.
     """
 
-    def __init__(self, maxlen: int):
-        """Initialise the rolling mean.
+    def __init__(self, window: int, alpha: Optional[float] = None):
+        """Initialise the rolling statistics.
 
-        This constructor initialises a rolling mean object of the specified length.
+        This constructor initialises a rolling statistics object of the specified window length.
 
-        :param maxlen: maximum length of the rolling mean.
+        :param window: number of samples in the window
+        :param alpha: optional EWMA smoothing factor, defaults to 2 / (window + 1)
         """
-        super().__init__([], maxlen=maxlen)
+        self.window = max(1, window)
+        self.alpha = alpha if alpha is not None else 2.0 / (self.window + 1)
+
+        # Ring buffer of the samples in the window and the total number of samples appended
+        self.samples = array("d", bytes(8 * self.window))
+        self.total = 0
+
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._ewma = 0.0
+
+        # Monotonic deques of (sample number, value), from which the window minimum and maximum
+        # are the first elements
+        self._min: Deque[Tuple[int, float]] = deque()
+        self._max: Deque[Tuple[int, float]] = deque()
+
+    def __len__(self) -> int:
+        """Return the number of samples in the window."""
+        return min(self.total, self.window)
+
+    def append(self, value: float) -> None:
+        """Append a value to the window, removing the oldest if the window is full.
+
+        :param value: value to append
+        """
+        value = float(value)
+        slot = self.total % self.window
+
+        if self.total < self.window:
+            count = self.total + 1
+            delta = value - self._mean
+            self._mean += delta / count
+            self._m2 += delta * (value - self._mean)
+        else:
+            oldest = self.samples[slot]
+            mean = self._mean
+            self._mean += (value - oldest) / self.window
+            self._m2 = max(0.0, self._m2 + (value - oldest) * (value - self._mean + oldest - mean))
+
+        if not self.total:
+            self._ewma = value
+        self._ewma += self.alpha * (value - self._ewma)
+        self.samples[slot] = value
+
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((self.total, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((self.total, value))
+
+        self.total += 1
+        for extremes in (self._min, self._max):
+            if extremes[0][0] < self.total - self.window:
+                extremes.popleft()
+
+    def clear(self) -> None:
+        """Remove all values from the window."""
+        self.total = 0
+        self._mean = self._m2 = self._ewma = 0.0
+        self._min.clear()
+        self._max.clear()
 
     @property
-    def mean(self):
-        """Return the current rolling mean.
+    def mean(self) -> float:
+        """Return the mean of the values in the window."""
+        return self._mean
 
-        This property method calculates and returns the current mean of the values held in the
-        object. If no values have been appended, the mean is returned as zero.
+    @property
+    def sum(self) -> float:
+        """Return the sum of the values in the window."""
+        return self._mean * len(self)
 
-        :return: mean of the current values in the object
+    @property
+    def variance(self) -> float:
+        """Return the sample variance of the values in the window, zero for fewer than two."""
+        count = len(self)
+        return self._m2 / (count - 1) if count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        """Return the sample standard deviation of the values in the window."""
+        return math.sqrt(self.variance)
+
+    @property
+    def ewma(self) -> float:
+        """Return the exponentially weighted moving average of all the values appended."""
+        return self._ewma
+
+    @property
+    def min(self) -> float:
+        """Return the minimum of the values in the window."""
+        return self._min[0][1] if self._min else 0.0
+
+    @property
+    def max(self) -> float:
+        """Return the maximum of the values in the window."""
+        return self._max[0][1] if self._max else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """Return a dict of the current statistics."""
+        return {
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.min,
+            "max": self.max,
+            "ewma": self.ewma,
+        }
+
+    def __iter__(self) -> Iterator[float]:
+        """Iterate over the values in the window, oldest first."""
+        for idx in range(self.total - len(self), self.total):
+            yield self.samples[idx % self.window]
+
+
+class RollingMean(RollingStats):
+    """Simple rolling mean class.
+
+    This class is retained for compatibility with existing users; it is a RollingStats of the
+    specified number of samples, whose mean is valid for the first n samples before it is filled.
+    """
+
+    def __init__(self, maxlen: int):
+        """Initialise the rolling mean.
+
+        :param maxlen: maximum length of the rolling mean.
         """
-        mean = 0.0
-        if len(self):
-            mean = float(sum(self)) / len(self)
+        super().__init__(maxlen)
 
-        return mean
+    @property
+    def maxlen(self) -> int:
+        """Return the maximum length of the rolling mean."""
+        return self.window
 
 
 class GpioFanSpeed:
@@ -61,6 +196,15 @@ class GpioFanSpeed:
         tach_pin: str,
         pwm_pin: Optional[str] = None,
         edge: int = GPIO.RISING,
+        period_mode: bool = False,
+        edge_buffer: int = 16,
+        edge_timeout: float = 1.0,
+        short_window: int = 5,
+        long_window: int = 10,
+        stall_factor: float = 3.0,
+        stall_min_time: float = 0.5,
+        degraded_fraction: float = 0.7,
+        baseline_rpm: Optional[float] = None,
     ):
         """Initialise the GPIO fan speed object.
 
@@ -71,9 +215,39 @@ class GpioFanSpeed:
         :param tach_pin : fan tachometer GPIO pin name (using Adafruit_BBIO naming convention)
         :param pwm_pin : optional fan PWM control GPIO pin name
         :param edge : optional edge to detec, defaults to rising edge
+        :param period_mode : measure frequency from the intervals between edges
+        :param edge_buffer : number of edge timestamps held in period measurement mode
+        :param edge_timeout : time in seconds without an edge after which the frequency measured
+                              in period measurement mode is zero
+        :param short_window : number of samples in the short rolling statistics window
+        :param long_window : number of samples in the long rolling statistics window
+        :param stall_factor : number of expected pulse periods without an edge after which the fan
+                              is stalled
+        :param stall_min_time : minimum time in seconds without an edge after which the fan is
+                                stalled, to ride out update and callback latency
+        :param degraded_fraction : fraction of the baseline speed below which the fan is degraded
+        :param baseline_rpm : optional baseline fan speed, learnt from the measured speed if None
         """
         self.tach_pin = tach_pin
         self.pwm_pin = pwm_pin
+        self.period_mode = period_mode
+        self.edge_timeout = edge_timeout
+
+        # Initialise the ring buffer of edge timestamps, shared with the GPIO callback thread
+        self.edge_lock = threading.Lock()
+        self.edge_times = array("d", bytes(8 * max(2, edge_buffer)))
+        self.edge_head = 0
+        self.edge_count = 0
+
+        # Initialise the stall and degradation detection. Before the first edge, the stall timeout
+        # runs from creation.
+        self.stall_factor = stall_factor
+        self.stall_min_time = stall_min_time
+        self.degraded_fraction = degraded_fraction
+        self.learn_baseline = baseline_rpm is None
+        self.baseline = (baseline_rpm or 0.0) / 30
+        self.start_time = time.perf_counter()
+        self.last_edge: Optional[float] = None
 
         # Initialise state of internal counters
         self.event_count = 0
@@ -83,8 +257,8 @@ class GpioFanSpeed:
 
         # Initialise frequency variables
         self.freq_1 = 0.0
-        self.freq_5 = RollingMean(5)
-        self.freq_10 = RollingMean(10)
+        self.freq_short = RollingStats(short_window)
+        self.freq_long = RollingStats(long_window)
 
         # If the PWM pin is specified, enable it as an output. For now set the initial default value
         # to high.
@@ -99,33 +273,70 @@ class GpioFanSpeed:
         """Call back on edge event detection.
 
         This method is called back when an edge detection event occurs on the tacho pin. The
-        event counter is simply incremented.
+        event counter is simply incremented and the time of the edge is recorded, in period
+        measurement mode also in the edge timestamp ring buffer.
 
         :param _ : unused channel argument required by the GPIO callback mechanism
         """
+        now = time.perf_counter()
         self.event_count += 1
+        self.last_edge = now
+
+        if self.period_mode:
+            with self.edge_lock:
+                self.edge_times[self.edge_head] = now
+                self.edge_head = (self.edge_head + 1) % len(self.edge_times)
+                self.edge_count = min(self.edge_count + 1, len(self.edge_times))
+
+    def edge_frequency(self) -> float:
+        """Calculate the frequency of the most recent edges.
+
+        This method calculates the frequency from the interval spanned by the edge timestamps
+        held in the ring buffer. If fewer than two edges have been recorded, or no edge has been
+        recorded within the edge timeout, the frequency is zero.
+
+        :return: edge frequency in Hz
+        """
+        with self.edge_lock:
+            count = self.edge_count
+            size = len(self.edge_times)
+            first = self.edge_times[(self.edge_head - count) % size]
+            last = self.edge_times[(self.edge_head - 1) % size]
+
+        if count < 2 or last <= first or time.perf_counter() - last > self.edge_timeout:
+            return 0.0
+
+        return (count - 1) / (last - first)
 
     def update(self) -> None:
         """Update fan speed calculations.
 
         This method should be called periodically, e.g. by a background update loop in an adapter,
-        to update current fan speed readings. Based on the event counter, this calculates and stores
-        the current fan frequency (in Hz) and appends the value to the rolling 5- and 10-sample
-        means.
+        to update current fan speed readings. Based on the event counter, or the edge timestamps
+        in period measurement mode, this calculates and stores the current fan frequency (in Hz)
+        and appends the value to the short and long rolling statistics.
         """
         # Copy the current count locally for consistency and save the current time
         current_count = self.event_count
-        now = time.time()
+        now = time.monotonic()
 
         # Calculate the event count delta
         self.delta = current_count - self.last_count
 
         # If a previous update has been done, calculate and store the frequency and append to the
         # rolling means.
-        if self.last_time:
+        if self.period_mode:
+            self.freq_1 = self.edge_frequency()
+            self.freq_short.append(self.freq_1)
+            self.freq_long.append(self.freq_1)
+        elif self.last_time:
             self.freq_1 = self.delta / (now - self.last_time)
-            self.freq_5.append(self.freq_1)
-            self.freq_10.append(self.freq_1)
+            self.freq_short.append(self.freq_1)
+            self.freq_long.append(self.freq_1)
+
+        # Raise the learnt baseline to the long window mean once the window is full
+        if self.learn_baseline and len(self.freq_long) == self.freq_long.window:
+            self.baseline = max(self.baseline, self.freq_long.mean)
 
         # Store the last count and time
         self.last_count = current_count
@@ -154,24 +365,102 @@ class GpioFanSpeed:
         """
         return self.freq_to_rpm(self.freq_1)
 
+    @property
+    def rpm_short(self) -> int:
+        """Return the current short rolling mean fan speed in RPM.
+
+        This property method returns the current fan speed as RPM from the short window rolling
+        mean. The value is rounded to integer to remove the pulse sampling quantisation.
+
+        :return current short window rolling average fan speed in RPM
+        """
+        return self.freq_to_rpm(self.freq_short.mean)
+
+    @property
+    def rpm_long(self) -> int:
+        """Return the current long rolling mean fan speed in RPM.
+
+        This property method returns the current fan speed as RPM from the long window rolling
+        mean. The value is rounded to integer to remove the pulse sampling quantisation.
+
+        :return current long window rolling average fan speed in RPM
+        """
+        return self.freq_to_rpm(self.freq_long.mean)
+
+    @property
+    def freq_5(self) -> RollingStats:
+        """Return the short window frequency statistics, an alias retained for compatibility."""
+        return self.freq_short
+
+    @property
+    def freq_10(self) -> RollingStats:
+        """Return the long window frequency statistics, an alias retained for compatibility."""
+        return self.freq_long
+
     @property
     def rpm_5(self) -> int:
-        """Return the current 5-sample rolling mean fan speed in RPM.
+        """Return the current short rolling mean fan speed in RPM, 5 samples by default.
 
-        This property method returns the current fan speed as RPM from the 5-sample rolling mean.
-        The value is rounded to integer to remove the pulse sampling quantisation.
+        This property method is an alias of rpm_short, retained for compatibility.
 
-        :return current 5-sample rolling average fan speed in RPM
+        :return current short window rolling average fan speed in RPM
         """
-        return self.freq_to_rpm(self.freq_5.mean)
+        return self.rpm_short
 
     @property
     def rpm_10(self) -> int:
-        """Return the current 10-sample rolling mean fan speed in RPM.
+        """Return the current long rolling mean fan speed in RPM, 10 samples by default.
+
+        This property method is an alias of rpm_long, retained for compatibility.
+
+        :return current long window rolling average fan speed in RPM
+        """
+        return self.rpm_long
+
+    @property
+    def rpm_jitter(self) -> float:
+        """Return the current fan speed jitter in RPM.
+
+        This property method returns the standard deviation of the fan speed over the long window,
+        as a measure of its stability.
+
+        :return current long window standard deviation of the fan speed in RPM
+        """
+        return self.freq_long.std * 30
+
+    @property
+    def baseline_rpm(self) -> int:
+        """Return the baseline fan speed in RPM.
+
+        :return baseline fan speed in RPM, zero until learnt
+        """
+        return self.freq_to_rpm(self.baseline)
+
+    @property
+    def stalled(self) -> bool:
+        """Return true if the fan is stalled.
+
+        This property method returns true if no edge has been detected within the stall factor
+        multiple of the pulse period expected at the baseline speed, or within the edge timeout
+        if no baseline has been learnt yet. The limit is no shorter than the minimum stall time,
+        as at full speed the expected period is far shorter than the jitter of the callbacks.
+        It is evaluated against the time of the last edge, so does not wait for the next update.
+
+        :return true if the fan is stalled
+        """
+        last_edge = self.last_edge if self.last_edge is not None else self.start_time
+        limit = self.stall_factor / self.baseline if self.baseline else self.edge_timeout
+        return time.perf_counter() - last_edge > max(limit, self.stall_min_time)
+
+    @property
+    def degraded(self) -> bool:
+        """Return true if the fan speed is degraded.
 
-        This property method returns the current fan speed as RPM from the 10-sample rolling mean.
-        The value is rounded to integer to remove the pulse sampling quantisation.
+        This property method returns true if every sample in the long statistics window is below
+        the degraded fraction of the baseline speed.
 
-        :return current 10-sample rolling average fan speed in RPM
+        :return true if the fan speed is degraded
         """
-        return self.freq_to_rpm(self.freq_10.mean)
+        return bool(self.baseline) and len(self.freq_long) == self.freq_long.window and (
+            self.freq_long.max < self.degraded_fraction * self.baseline
+        )
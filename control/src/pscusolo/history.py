@@ -0,0 +1,458 @@
+"""In-memory history of PSCUSolo snapshots.
+
+This module implements a fixed-capacity ring buffer recording the values of every signal of each
+published PSCUSolo snapshot, i.e. the raw ADC codes, fan speeds and status bits. The ADC signals
+are recorded as their 12-bit codes, one per ADC channel, and converted to engineering values when
+queried, so the raw codes of every channel remain available and each snapshot takes a fraction of
+the memory of its converted values. The buffer is preallocated as flat arrays when created, so its
+memory use is bounded and known up front, and recording a snapshot copies its values in place
+without allocating.
+
+STFC Detector Systems Software Group
+"""
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+from pscusolo.ring import RingBuffer
+
+
+class History(RingBuffer):
+    """Snapshot history ring buffer class.
+
+    This class records PSCUSolo state records in a ring buffer of the last capacity snapshots,
+    and answers time-range queries of the recorded values of selected signals.
+    """
+
+    def __init__(self, pscu, capacity: int):
+        """Initialise the history buffer.
+
+        :param pscu: PSCUSolo instance whose state records are to be recorded
+        :param capacity: number of snapshots to hold
+        """
+        super().__init__(capacity)
+        self.pscu = pscu
+        self.num_codes = 8 * len(pscu.adc)
+        self.num_status = sum(1 for (is_status, _, _) in pscu.layout if is_status)
+
+        # Offsets in the state records of the analog values not derived from ADC codes, which are
+        # recorded as they are
+        self.analog_offsets = [
+            offset for (signal, (is_status, offset, _)) in zip(pscu.SIGNALS, pscu.layout)
+            if not is_status and signal.name not in pscu.adc_channels
+        ]
+        self.num_analog = len(self.analog_offsets)
+        analog_index = {offset: idx for (idx, offset) in enumerate(self.analog_offsets)}
+
+        # Column of each signal in the buffer, as the status offset, the ADC channel and lookup
+        # table or the index of the analog value
+        self.columns: Dict[str, tuple] = {}
+        for (signal, (is_status, offset, value_type)) in zip(pscu.SIGNALS, pscu.layout):
+            if is_status:
+                self.columns[signal.name] = ("status", offset, value_type)
+            elif signal.name in pscu.adc_channels:
+                self.columns[signal.name] = (
+                    "code", pscu.adc_channels[signal.name], pscu.luts[signal.conversion]
+                )
+            else:
+                self.columns[signal.name] = ("analog", analog_index[offset], value_type)
+
+        self.seqs = array("Q", bytes(8 * self.capacity))
+        self.timestamps = array("d", bytes(8 * self.capacity))
+        self.codes = array("H", bytes(2 * self.capacity * self.num_codes))
+        self.analog = array("d", bytes(8 * self.capacity * self.num_analog))
+        self.status = bytearray(self.capacity * self.num_status)
+
+    @property
+    def memory(self) -> int:
+        """Return the memory used by the buffer in bytes."""
+        return sum(
+            buf.itemsize * len(buf) for buf in (self.seqs, self.timestamps, self.codes, self.analog)
+        ) + len(self.status)
+
+    def record(self, state) -> None:
+        """Record the values of a state record, overwriting the oldest if the buffer is full.
+
+        :param state: PSCUSoloState record to record
+        """
+        slot = self.advance()
+        self.seqs[slot] = state.seq
+        self.timestamps[slot] = state.timestamp
+        self.codes[slot * self.num_codes:(slot + 1) * self.num_codes] = state.codes
+        base = slot * self.num_analog
+        for (idx, offset) in enumerate(self.analog_offsets):
+            self.analog[base + idx] = state.analog[offset]
+        self.status[slot * self.num_status:(slot + 1) * self.num_status] = state.status
+
+    def copy_from(self, other: "History") -> None:
+        """Record the snapshots held in another history buffer, oldest first.
+
+        :param other: history buffer of the same PSCUSolo to copy from
+        """
+        for idx in range(other.count):
+            src = other.slot(idx)
+            slot = self.advance()
+            self.seqs[slot] = other.seqs[src]
+            self.timestamps[slot] = other.timestamps[src]
+            self.codes[slot * self.num_codes:(slot + 1) * self.num_codes] = (
+                other.codes[src * other.num_codes:(src + 1) * other.num_codes]
+            )
+            self.analog[slot * self.num_analog:(slot + 1) * self.num_analog] = (
+                other.analog[src * other.num_analog:(src + 1) * other.num_analog]
+            )
+            self.status[slot * self.num_status:(slot + 1) * self.num_status] = (
+                other.status[src * other.num_status:(src + 1) * other.num_status]
+            )
+
+    def time_at(self, slot: int) -> float:
+        """Return the timestamp of the snapshot recorded in a slot.
+
+        :param slot: buffer slot of the snapshot
+        """
+        return self.timestamps[slot]
+
+    def oldest(self) -> Optional[float]:
+        """Return the timestamp of the oldest recorded snapshot, or None if there are none."""
+        return self.timestamps[self.slot(0)] if self.count else None
+
+    def newest(self) -> Optional[float]:
+        """Return the timestamp of the newest recorded snapshot, or None if there are none."""
+        return self.timestamps[self.slot(self.count - 1)] if self.count else None
+
+    def query(
+        self, start: Optional[float] = None, end: Optional[float] = None,
+        names: Optional[Iterable[str]] = None, limit: Optional[int] = None, raw: bool = False
+    ) -> Dict[str, object]:
+        """Query the recorded values of signals over a time range.
+
+        If the range holds more than limit snapshots, the result is truncated to the first limit
+        of them and flagged as such; the rest of the range may be queried by starting at the
+        timestamp of the last snapshot returned.
+
+        :param start: optional timestamp of the start of the range, from the oldest if None
+        :param end: optional timestamp of the end of the range, to the newest if None
+        :param names: optional names of the signals to return, all signals if None
+        :param limit: optional maximum number of snapshots to return, from the start of the range
+        :param raw: return the ADC codes of ADC signals rather than their converted values
+        :return: dict of lists of the sequence numbers and timestamps of the snapshots in the
+                 range, and of the values of each signal, keyed by name, and the truncated flag
+        """
+        if names is None:
+            names = [signal.name for signal in self.pscu.SIGNALS]
+
+        columns = []
+        for name in names:
+            if name not in self.columns:
+                raise ValueError("Unknown signal: {}".format(name))
+            columns.append((name, self.columns[name]))
+
+        first = self.bisect(start) if start is not None else 0
+        last = self.bisect(end, after=True) if end is not None else self.count
+        truncated = False
+        if limit is not None and last - first > limit:
+            (last, truncated) = (first + limit, True)
+        slots = [self.slot(idx) for idx in range(first, last)]
+
+        values: Dict[str, List] = {}
+        for (name, (kind, index, convert)) in columns:
+            if kind == "status":
+                status = self.status
+                stride = self.num_status
+                values[name] = [convert(status[slot * stride + index]) for slot in slots]
+            elif kind == "code":
+                codes = self.codes
+                stride = self.num_codes
+                if raw:
+                    values[name] = [codes[slot * stride + index] for slot in slots]
+                else:
+                    values[name] = [convert[codes[slot * stride + index]] for slot in slots]
+            else:
+                analog = self.analog
+                stride = self.num_analog
+                values[name] = [convert(analog[slot * stride + index]) for slot in slots]
+
+        return {
+            "seq": [self.seqs[slot] for slot in slots],
+            "timestamp": [self.timestamps[slot] for slot in slots],
+            "values": values,
+            "truncated": truncated,
+        }
+
+
+class AggregateTier(RingBuffer):
+    """Downsampled history tier class.
+
+    This class holds a ring buffer of fixed-period buckets, each holding the sample count and the
+    minimum, maximum and sum of each of a set of values over the bucket period. Samples, or the
+    buckets of a finer tier, are folded into the current bucket as they arrive; when one arrives
+    for a later period, the current bucket is closed into the ring buffer.
+    """
+
+    def __init__(self, period: float, capacity: int, num_values: int):
+        """Initialise the tier.
+
+        :param period: bucket period in seconds
+        :param capacity: number of closed buckets to hold
+        :param num_values: number of values aggregated in each bucket
+        """
+        super().__init__(capacity)
+        self.period = period
+        self.num_values = num_values
+
+        self.starts = array("d", bytes(8 * self.capacity))
+        self.counts = array("Q", bytes(8 * self.capacity))
+        self.mins = array("d", bytes(8 * self.capacity * num_values))
+        self.maxs = array("d", bytes(8 * self.capacity * num_values))
+        self.sums = array("d", bytes(8 * self.capacity * num_values))
+
+        # Current, open bucket, empty while its count is zero
+        self.current_start = 0.0
+        self.current_count = 0
+        self.current_mins = array("d", bytes(8 * num_values))
+        self.current_maxs = array("d", bytes(8 * num_values))
+        self.current_sums = array("d", bytes(8 * num_values))
+
+    @property
+    def memory(self) -> int:
+        """Return the memory used by the tier in bytes."""
+        return sum(
+            buf.itemsize * len(buf) for buf in (
+                self.starts, self.counts, self.mins, self.maxs, self.sums,
+                self.current_mins, self.current_maxs, self.current_sums
+            )
+        )
+
+    def time_at(self, slot: int) -> float:
+        """Return the start time of the closed bucket in a slot.
+
+        :param slot: buffer slot of the bucket
+        """
+        return self.starts[slot]
+
+    def oldest(self) -> Optional[float]:
+        """Return the start time of the oldest bucket, or None if there are none."""
+        if self.count:
+            return self.starts[self.slot(0)]
+        return self.current_start if self.current_count else None
+
+    def add(self, timestamp: float, count: int, mins, maxs, sums) -> Optional[int]:
+        """Fold a sample or finer bucket into the tier.
+
+        :param timestamp: time of the sample or start time of the bucket
+        :param count: number of samples aggregated
+        :param mins: double array of the minimum of each value
+        :param maxs: double array of the maximum of each value
+        :param sums: double array of the sum of each value
+        :return: buffer slot of the bucket closed by the addition, or None
+        """
+        start = timestamp - (timestamp % self.period)
+        closed = None
+        if start != self.current_start or not self.current_count:
+            if self.current_count:
+                closed = self.close()
+            self.current_start = start
+            self.current_count = 0
+
+        if self.current_count:
+            for idx in range(self.num_values):
+                if mins[idx] < self.current_mins[idx]:
+                    self.current_mins[idx] = mins[idx]
+                if maxs[idx] > self.current_maxs[idx]:
+                    self.current_maxs[idx] = maxs[idx]
+                self.current_sums[idx] += sums[idx]
+        else:
+            self.current_mins[:] = mins
+            self.current_maxs[:] = maxs
+            self.current_sums[:] = sums
+        self.current_count += count
+
+        return closed
+
+    def close(self) -> int:
+        """Close the current bucket into the ring buffer.
+
+        :return: buffer slot of the closed bucket
+        """
+        slot = self.advance()
+        (first, last) = (slot * self.num_values, (slot + 1) * self.num_values)
+        self.starts[slot] = self.current_start
+        self.counts[slot] = self.current_count
+        self.mins[first:last] = self.current_mins
+        self.maxs[first:last] = self.current_maxs
+        self.sums[first:last] = self.current_sums
+
+        return slot
+
+    def bucket(self, slot: int):
+        """Return the contents of a closed bucket, in the form accepted by add().
+
+        :param slot: buffer slot of the bucket
+        :return: tuple of the start time, count and the minima, maxima and sums of the values
+        """
+        (first, last) = (slot * self.num_values, (slot + 1) * self.num_values)
+        return (
+            self.starts[slot], self.counts[slot],
+            self.mins[first:last], self.maxs[first:last], self.sums[first:last]
+        )
+
+    def buckets(
+        self, start: Optional[float] = None, end: Optional[float] = None,
+        open_buckets: Optional[List[tuple]] = None
+    ):
+        """Return the buckets over a time range, including the open ones.
+
+        The closed buckets overlapping the range, i.e. those starting less than a period before
+        its start and no later than its end, are found by binary search.
+
+        :param start: optional start of the range, from the oldest bucket if None
+        :param end: optional end of the range, to the current bucket if None
+        :param open_buckets: optional list of the open buckets, following the closed ones, in
+                             place of the current bucket
+        :return: list of (start time, count, minima, maxima, sums) tuples, oldest first
+        """
+        first = self.bisect(start - self.period, after=True) if start is not None else 0
+        last = self.bisect(end, after=True) if end is not None else self.count
+        buckets = [self.bucket(self.slot(idx)) for idx in range(first, last)]
+
+        if open_buckets is None:
+            open_buckets = [self.current()] if self.current_count else []
+        buckets.extend(
+            bucket for bucket in open_buckets
+            if (start is None or bucket[0] + self.period > start)
+            and (end is None or bucket[0] <= end)
+        )
+
+        return buckets
+
+    def current(self):
+        """Return the contents of the current bucket, in the form accepted by add()."""
+        return (
+            self.current_start, self.current_count,
+            self.current_mins, self.current_maxs, self.current_sums
+        )
+
+
+class TrendHistory:
+    """Multi-resolution downsampled history class.
+
+    This class records a set of PSCUSolo analog signals into cascading aggregation tiers of
+    increasing bucket period, each bucket closed in a tier being folded into the next, so that
+    long periods of history are held in bounded memory at decreasing resolution. The current
+    bucket of each tier only includes the closed buckets of the tier below it, so queries merge
+    in the current buckets of the finer tiers to include the newest samples.
+    """
+
+    def __init__(self, pscu, names: Iterable[str], tiers: Iterable[Iterable]):
+        """Initialise the downsampled history.
+
+        :param pscu: PSCUSolo instance whose state records are to be recorded
+        :param names: names of the analog signals to record
+        :param tiers: iterable of (bucket period in seconds, capacity) pairs, finest first
+        """
+        self.names = list(names)
+        self.offsets = [pscu.layout[pscu.signal_index[name]][1] for name in self.names]
+        self.tiers = [
+            AggregateTier(period, capacity, len(self.names)) for (period, capacity) in tiers
+        ]
+        self.values = array("d", bytes(8 * len(self.names)))
+
+    @property
+    def memory(self) -> int:
+        """Return the memory used by the tiers in bytes."""
+        return sum(tier.memory for tier in self.tiers)
+
+    def record(self, state) -> None:
+        """Record the values of a state record, cascading any closed buckets to coarser tiers.
+
+        :param state: PSCUSoloState record to record
+        """
+        for (idx, offset) in enumerate(self.offsets):
+            self.values[idx] = state.analog[offset]
+
+        sample = (state.timestamp, 1, self.values, self.values, self.values)
+        for tier in self.tiers:
+            slot = tier.add(*sample)
+            if slot is None:
+                break
+            sample = tier.bucket(slot)
+
+    def select_tier(
+        self, start: Optional[float] = None, resolution: Optional[float] = None
+    ) -> AggregateTier:
+        """Select the tier to answer a query.
+
+        This is the coarsest tier with a bucket period no longer than the resolution or, if no
+        resolution is given, the finest tier that covers the start of the range, the coarsest
+        tier covering the longest period otherwise.
+
+        :param start: optional start of the range
+        :param resolution: optional longest bucket period in seconds
+        """
+        if resolution is not None:
+            tiers = [tier for tier in self.tiers if tier.period <= resolution]
+            return tiers[-1] if tiers else self.tiers[0]
+
+        if start is not None:
+            for tier in self.tiers:
+                oldest = tier.oldest()
+                if oldest is not None and oldest <= start:
+                    return tier
+
+        return self.tiers[-1]
+
+    def open_buckets(self, tier: AggregateTier) -> List[tuple]:
+        """Return the open buckets of a tier, including the samples held in the finer tiers.
+
+        The samples not yet closed into the current bucket of a tier are held in the current
+        buckets of the finer tiers, each later than the last. These are folded into buckets of
+        the period of the tier, the newest of which may follow its current bucket.
+
+        :param tier: tier of the query
+        :return: list of (start time, count, minima, maxima, sums) tuples, oldest first
+        """
+        merged = AggregateTier(tier.period, len(self.tiers), len(self.names))
+        for finer in reversed(self.tiers[:self.tiers.index(tier) + 1]):
+            if finer.current_count:
+                merged.add(*finer.current())
+        if merged.current_count:
+            merged.close()
+
+        return [merged.bucket(merged.slot(idx)) for idx in range(merged.count)]
+
+    def query(
+        self, start: Optional[float] = None, end: Optional[float] = None,
+        resolution: Optional[float] = None, names: Optional[Iterable[str]] = None
+    ) -> Dict[str, object]:
+        """Query the downsampled values of signals over a time range.
+
+        :param start: optional start of the range, from the oldest bucket if None
+        :param end: optional end of the range, to the current bucket if None
+        :param resolution: optional longest bucket period in seconds
+        :param names: optional names of the signals to return, all recorded signals if None
+        :return: dict of the bucket period, lists of the start times and sample counts of the
+                 buckets in the range, and of the minimum, mean and maximum of each signal
+        """
+        if names is None:
+            names = self.names
+
+        columns = []
+        for name in names:
+            if name not in self.names:
+                raise ValueError("Signal not recorded in trend history: {}".format(name))
+            columns.append((name, self.names.index(name)))
+
+        tier = self.select_tier(start, resolution)
+        buckets = tier.buckets(start, end, self.open_buckets(tier))
+
+        return {
+            "period": tier.period,
+            "start": [bucket[0] for bucket in buckets],
+            "count": [bucket[1] for bucket in buckets],
+            "values": {
+                name: {
+                    "min": [bucket[2][idx] for bucket in buckets],
+                    "mean": [bucket[4][idx] / bucket[1] for bucket in buckets],
+                    "max": [bucket[3][idx] for bucket in buckets],
+                }
+                for (name, idx) in columns
+            },
+        }
@@ -6,8 +6,11 @@ the LPD PSCUsolo controller.
 Harvey Wornham, STFC Detector Systems Software Group
 
 """
-import math
 import time
+from array import array
+from collections import deque
+from functools import partial
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
 
 from odin_devices.i2c_device import I2CDevice
 from odin_devices.tca9548 import TCA9548
@@ -15,89 +18,189 @@ from odin_devices.tca9548 import TCA9548
 from odin_devices.ad5593r import AD5593R
 from odin_devices.mcp23008 import MCP23008
 
+from pscusolo.conversion import (
+    ADC_CODES, get_lut, humid_adc, humid_raw_adc, leak_adc, temp1_adc, temp1_raw_adc, temp2_adc,
+    temp2_raw_adc
+)
 from pscusolo.gpio_fan_speed import GpioFanSpeed
-
-def temp1_adc(adc_val):
-    """Calculate temp1 value from ADC chip."""
-    temp1 = ((adc_val / 4095.)*218.75 - 66.875)
-    return temp1
-
-
-def temp1_raw_adc(adc_val):
-    """Calculate temp1 raw value from ADC chip."""
-    temp1 = (adc_val / 4095.)
-    return temp1
-
-
-def temp2_adc(adc_val):
-    """Calculate temp2 value from ADC chip."""
-    a = 1.039e-3
-    b = 2.354e-4
-    c = 1.939e-7
-    r = (40950000.0 / adc_val) - 10000
-    temp2 = (1.0 / (a + b * math.log(r) + c * (math.log(r)**3))) - 273.15
-    return temp2
-
-
-def temp2_raw_adc(adc_val):
-    """Calculate temp2 raw value from ADC chip."""
-    temp2 = (adc_val / 4095.)
-    return temp2
-
-
-def humid_adc(adc_val):
-    """Calculate humidity value from ADC chip."""
-    humid = ((adc_val / 4095.)*125.0) - 12.5
-    return humid
-
-
-def humid_raw_adc(adc_val):
-    """Calculate humidity raw value from ADC chip."""
-    humid = (adc_val / 4095.)
-    return humid
-
-
-def leak_adc(adc_val):
-    """Calculate leak value from ADC chip."""
-    leak = ((adc_val / 4095.)*5) / 150e-3
-    return leak
+from pscusolo.scan import ScanPlanner, ScanTransaction
+
+# Scan classes, in order of decreasing scan rate: trip, latch and health states, measured values and
+# front panel setpoints
+SCAN_FAST = "fast"
+SCAN_NORMAL = "normal"
+SCAN_SLOW = "slow"
+SCAN_CLASSES = (SCAN_FAST, SCAN_NORMAL, SCAN_SLOW)
+
+# Signal sources: AD5593R ADC channels, MCP23008 input pins, fan tachometers, fan baseline speeds,
+# fan stall and degradation flags and logic derived from other signals
+ADC = "adc"
+GPIO = "gpio"
+FAN = "fan"
+FAN_BASELINE = "fan_baseline"
+FAN_STALLED = "fan_stalled"
+FAN_DEGRADED = "fan_degraded"
+LOGIC = "logic"
+
+
+class Signal(NamedTuple):
+    """Declaration of a single PSCUSolo signal.
+
+    The pin depends on the device: a (chip, channel) tuple for ADC signals, an (expander, pin)
+    tuple for GPIO signals, the fan index for the FAN signal types and a tuple of input signal
+    names for LOGIC signals. The conversion is applied to the ADC code, via a lookup table
+    precomputed over all codes, or, for LOGIC signals, to the list of input values. Signals with
+    no tree path are acquired but not shown in the parameter tree.
+    """
+
+    name: str
+    device: str
+    pin: Any
+    conversion: Optional[Callable] = None
+    invert: bool = False
+    scan: str = SCAN_FAST
+    path: Optional[str] = None
+
+
+class PSCUSoloState:
+    """Compact, sequence-numbered record of the PSCUSolo state after an update.
+
+    Analog values (ADC conversions and fan speeds) are held in a double array and boolean states
+    in a byte array, at offsets given by the PSCUSolo signal layout. The raw codes the ADC values
+    were converted from are held in an unsigned short array indexed by ADC channel. Records are
+    pooled and reused by PSCUSolo, so a record must not be modified once published and should be
+    released back to the pool once it has been superseded.
+    """
+
+    __slots__ = (
+        "seq", "timestamp", "analog", "status", "codes", "mux_switches", "mux_switches_saved"
+    )
+
+    def __init__(self, num_analog, num_status, num_codes):
+        """Initialise the state record.
+
+        :param num_analog: number of analog values
+        :param num_status: number of boolean states
+        :param num_codes: number of ADC channels
+        """
+        self.seq = 0
+        self.timestamp = 0.0
+        self.analog = array("d", bytes(8 * num_analog))
+        self.status = bytearray(num_status)
+        self.codes = array("H", bytes(2 * num_codes))
+        self.mux_switches = 0
+        self.mux_switches_saved = 0
+
+    def copy_from(self, other):
+        """Copy the contents of another state record into this one in place.
+
+        :param other: record to copy from
+        """
+        self.seq = other.seq
+        self.timestamp = other.timestamp
+        self.analog[:] = other.analog
+        self.status[:] = other.status
+        self.codes[:] = other.codes
+        self.mux_switches = other.mux_switches
+        self.mux_switches_saved = other.mux_switches_saved
+
+
+class ScanPlan(NamedTuple):
+    """Precomputed transactions and decode tables to scan a set of scan classes."""
+
+    transactions: List[ScanTransaction]
+    adc: List[Tuple[int, int, array]]
+    gpio: List[Tuple[int, int, int, bool]]
+    fan: List[Tuple[int, int, str]]
+    fan_flags: List[Tuple[int, int, str]]
+    logic: List[Tuple[int, List[int], Callable]]
 
 
 class PSCUSolo():
     """Create class that deffines all IO pins and updates them."""
 
-    ADC_PINS = {
-        "leak_value": (0, 0),
-        "temp1_value": (0, 2),
-        "humidity_value": (0, 3),
-        "temp2_value": (0, 6),
-        "temp1_sp_under": (1, 2),
-        "temp1_sp_over": (1, 3),
-        "humidity_sp": (1, 4),
-        "temp2_sp_over": (1, 5),
-        "temp2_sp_under": (1, 6),
-        "leak_sp": (1, 7),
-    }
-
-    INPUT_PINS = {
-        "humid_healthy": (0, 0),
-        "pump_healthy": (0, 1),
-        "temp_healthy": (0, 2),
-        "leak_healthy": (0, 3),
-        "leak_tripped": (0, 4),
-        "tripped": (0, 7),
-        "leak_latched": (1, 0),
-        "humid_latched": (1, 1),
-        "pump_latched": (1, 2),
-        "temp_latched": (1, 3),
-        "leak_trace": (1, 4),
-        "armed": (1, 5),
-        "temp1_over": (2, 0),
-        "temp1_under": (2, 1),
-        "humid_over": (2, 2),
-        "temp2_over": (2, 3),
-        "temp2_under": (2, 4),
-        "pump_trip": (2, 5),
+    ADC_SEQ_REG = 0x02
+    ADC_READBACK = 0x40
+
+    ADC_MUX_CHANNEL = 4
+    MCP_MUX_CHANNEL = 5
+
+    SIGNALS = (
+        Signal("overall", LOGIC,
+               ("temp_healthy", "humid_healthy", "leak_healthy", "pump_healthy"), all,
+               path="overall"),
+        Signal("latched", LOGIC,
+               ("temp_latched", "humid_latched", "leak_latched", "pump_latched"), any,
+               path="latched"),
+        Signal("armed", GPIO, (1, 5), path="armed"),
+        Signal("tripped", GPIO, (0, 7), invert=True, path="tripped"),
+
+        Signal("temp_healthy", GPIO, (0, 2), path="temperature/healthy"),
+        Signal("temp_latched", GPIO, (1, 3), invert=True, path="temperature/latched"),
+        Signal("temp1_trip_over", GPIO, (2, 0), invert=True,
+               path="temperature/sensors/0/trip_over"),
+        Signal("temp1_trip_under", GPIO, (2, 1), invert=True,
+               path="temperature/sensors/0/trip_under"),
+        Signal("temp1", ADC, (0, 2), temp1_adc, scan=SCAN_NORMAL,
+               path="temperature/sensors/0/temperature"),
+        Signal("temp1_sp_over", ADC, (1, 3), temp1_adc, scan=SCAN_SLOW,
+               path="temperature/sensors/0/setpoint_over"),
+        Signal("temp1_sp_under", ADC, (1, 2), temp1_adc, scan=SCAN_SLOW,
+               path="temperature/sensors/0/setpoint_under"),
+        Signal("temp2_trip_over", GPIO, (2, 3), invert=True,
+               path="temperature/sensors/1/trip_over"),
+        Signal("temp2_trip_under", GPIO, (2, 4), invert=True,
+               path="temperature/sensors/1/trip_under"),
+        Signal("temp2", ADC, (0, 6), temp2_adc, scan=SCAN_NORMAL,
+               path="temperature/sensors/1/temperature"),
+        Signal("temp2_sp_over", ADC, (1, 5), temp2_adc, scan=SCAN_SLOW,
+               path="temperature/sensors/1/setpoint_over"),
+        Signal("temp2_sp_under", ADC, (1, 6), temp2_adc, scan=SCAN_SLOW,
+               path="temperature/sensors/1/setpoint_under"),
+        Signal("temp1_raw", ADC, (0, 2), temp1_raw_adc, scan=SCAN_NORMAL),
+        Signal("temp1_sp_over_raw", ADC, (1, 3), temp1_raw_adc, scan=SCAN_SLOW),
+        Signal("temp1_sp_under_raw", ADC, (1, 2), temp1_raw_adc, scan=SCAN_SLOW),
+        Signal("temp2_raw", ADC, (0, 6), temp2_raw_adc, scan=SCAN_NORMAL),
+        Signal("temp2_sp_over_raw", ADC, (1, 5), temp2_raw_adc, scan=SCAN_SLOW),
+        Signal("temp2_sp_under_raw", ADC, (1, 6), temp2_raw_adc, scan=SCAN_SLOW),
+
+        Signal("humid_healthy", GPIO, (0, 0), path="humidity/healthy"),
+        Signal("humid_latched", GPIO, (1, 1), invert=True, path="humidity/latched"),
+        Signal("humid_trip_over", GPIO, (2, 2), invert=True,
+               path="humidity/sensors/0/trip_over"),
+        Signal("humidity", ADC, (0, 3), humid_adc, scan=SCAN_NORMAL,
+               path="humidity/sensors/0/value"),
+        Signal("humid_sp", ADC, (1, 4), humid_adc, scan=SCAN_SLOW,
+               path="humidity/sensors/0/setpoint_over"),
+        Signal("humid_raw", ADC, (0, 3), humid_raw_adc, scan=SCAN_NORMAL),
+        Signal("humid_sp_raw", ADC, (1, 4), humid_raw_adc, scan=SCAN_SLOW),
+
+        Signal("leak_healthy", GPIO, (0, 3), path="leak/healthy"),
+        Signal("leak_latched", GPIO, (1, 0), invert=True, path="leak/latched"),
+        Signal("leak_trip_under", GPIO, (0, 4), invert=True, path="leak/sensors/0/trip_under"),
+        Signal("leak", ADC, (0, 0), leak_adc, scan=SCAN_NORMAL, path="leak/sensors/0/value"),
+        Signal("leak_sp", ADC, (1, 7), leak_adc, scan=SCAN_SLOW,
+               path="leak/sensors/0/setpoint_under"),
+        Signal("leak_trace", GPIO, (1, 4), path="leak/sensors/0/trace"),
+
+        Signal("pump_latched", GPIO, (1, 2), invert=True, path="pump/latched"),
+        Signal("pump_healthy", GPIO, (0, 1), path="pump/healthy"),
+        Signal("pump_trip", GPIO, (2, 5), path="pump/sensors/0/pump_trip"),
+
+        Signal("fan1_rpm", FAN, 0, path="fans/sensors/0/value"),
+        Signal("fan2_rpm", FAN, 1, path="fans/sensors/1/value"),
+        Signal("fan1_baseline", FAN_BASELINE, 0, scan=SCAN_SLOW, path="fans/sensors/0/baseline"),
+        Signal("fan2_baseline", FAN_BASELINE, 1, scan=SCAN_SLOW, path="fans/sensors/1/baseline"),
+        Signal("fan1_stalled", FAN_STALLED, 0, path="fans/sensors/0/stalled"),
+        Signal("fan1_degraded", FAN_DEGRADED, 0, path="fans/sensors/0/degraded"),
+        Signal("fan2_stalled", FAN_STALLED, 1, path="fans/sensors/1/stalled"),
+        Signal("fan2_degraded", FAN_DEGRADED, 1, path="fans/sensors/1/degraded"),
+    )
+
+    # GpioFanSpeed attribute giving the value of each fan flag signal
+    FAN_FLAGS = {
+        FAN_STALLED: "stalled",
+        FAN_DEGRADED: "degraded",
     }
 
     OUTPUT_PINS = {
@@ -105,176 +208,370 @@ class PSCUSolo():
         "arm": (0, 6),
     }
 
-    def __init__(self):
-        """Initailises all the: pins, boolean values and standard values."""
+    # Number of state records preallocated in the pool
+    STATE_POOL_SIZE = 3
+
+    def __init__(
+        self, bulk_read=True, fan_period_mode=True, fan_windows=(5, 10), fan_stall_factor=3.0,
+        fan_stall_min_time=0.5, fan_degraded_fraction=0.7, fan_baseline_rpm=None
+    ):
+        """Initailises all the: pins, boolean values and standard values.
+
+        :param bulk_read: read each MCP23008 GPIO port and each AD5593R conversion sequence once per
+                          update rather than pin by pin
+        :param fan_period_mode: measure fan speeds from the intervals between tacho edges, updated
+                                every cycle, rather than from edge counts every fourth cycle
+        :param fan_windows: numbers of samples in the short and long fan speed statistics windows
+        :param fan_stall_factor: number of expected tacho pulse periods without an edge after which
+                                 a fan is stalled
+        :param fan_stall_min_time: minimum time in seconds without an edge after which a fan is
+                                   stalled
+        :param fan_degraded_fraction: fraction of the baseline speed below which a fan is degraded
+        :param fan_baseline_rpm: optional baseline fan speed, learnt from the measured speeds if
+                                 None
+        """
         I2CDevice.set_default_i2c_bus(2)
 
+        self.bulk_read = bulk_read
+
         self.tca = TCA9548(address=0x70)
+        self.planner = ScanPlanner(self.tca)
 
         self.adc = []
         for addr in [0x10, 0x11]:
-            self.adc.append(self.tca.attach_device(4, AD5593R, addr))
-
-        self.adc[0].setup_adc(0x4d)
-        self.adc[1].setup_adc(0xfc)
+            self.adc.append(self.planner.attach_device(self.ADC_MUX_CHANNEL, AD5593R, addr))
 
         self.mcp = []
         for addr in [0x24, 0x27, 0x25]:
-            self.mcp.append(self.tca.attach_device(5, MCP23008, addr))
-
-        for (pin_name, (mcp_idx, pin)) in self.INPUT_PINS.items():
-            self.mcp[mcp_idx].setup(pin, MCP23008.IN)
-
-        for (pin_name, (mcp_idx, pin)) in self.OUTPUT_PINS.items():
-            self.mcp[mcp_idx].setup(pin, MCP23008.OUT)
+            self.mcp.append(self.planner.attach_device(self.MCP_MUX_CHANNEL, MCP23008, addr))
 
+        self.fan_period_mode = fan_period_mode
         self.fans = [
-            GpioFanSpeed("P8_18", "P8_16"),
-            GpioFanSpeed("P8_12", "P8_15"),
+            GpioFanSpeed(
+                tach_pin, pwm_pin, period_mode=fan_period_mode,
+                short_window=fan_windows[0], long_window=fan_windows[1],
+                stall_factor=fan_stall_factor, stall_min_time=fan_stall_min_time,
+                degraded_fraction=fan_degraded_fraction, baseline_rpm=fan_baseline_rpm
+            )
+            for (tach_pin, pwm_pin) in (("P8_18", "P8_16"), ("P8_12", "P8_15"))
         ]
-        self.fan_update_downscale = 4
+        self.fan_update_downscale = 1 if fan_period_mode else 4
         self.fan_update_counter = 0
 
-        self.armed = False
-        self.overall = False
-        self.latched = False
-
-        self.temp_healthy = False
-        self.temp_latched = False
-
-        self.temp1 = 0.0
-        self.temp1_raw = 0.0
-        self.temp1_trip_over = False
-        self.temp1_trip_under = False
-        self.temp1_sp_over = 0.0
-        self.temp1_sp_over_raw = 0.0
-        self.temp1_sp_under = 0.0
-        self.temp1_sp_under_raw = 0.0
-
-        self.temp2 = 0.0
-        self.temp2_raw = 0.0
-        self.temp2_trip_over = False
-        self.temp2_trip_under = False
-        self.temp2_sp_over = 0.0
-        self.temp2_sp_over_raw = 0.0
-        self.temp2_sp_under = 0.0
-        self.temp2_sp_under_raw = 0.0
-
-        self.humidity = 0.0
-        self.humid_raw = 0.0
-        self.humid_healthy = False
-        self.humid_latched = False
-        self.humid_trip_over = False
-        self.humid_sp = 0.0
-        self.humid_sp_raw = 0.0
-
-        self.leak = 0.0
-        self.leak_sp = 0.0
-        self.leak_healthy = False
-        self.leak_latched = False
-        self.leak_trip_under = False
-        self.leak_trace = False
-        self.pump_healthy = False
-        self.pump_trip = False
-        self.pump_latched = False
-
-        self.tripped = False
+        # Precompute the lookup table of each ADC conversion, so that converting a code is a
+        # single index operation
+        self.luts = {
+            signal.conversion: get_lut(signal.conversion)
+            for signal in self.SIGNALS if signal.device == ADC
+        }
+
+        # Index the signal table and lay the signals out in the state records, giving each an
+        # (is status, offset, type) entry
+        self.signal_index = {signal.name: idx for (idx, signal) in enumerate(self.SIGNALS)}
+        self.layout = []
+        num_analog = 0
+        num_status = 0
+        for signal in self.SIGNALS:
+            if signal.device in (GPIO, LOGIC, FAN_STALLED, FAN_DEGRADED):
+                self.layout.append((True, num_status, bool))
+                num_status += 1
+            else:
+                self.layout.append((
+                    False, num_analog, int if signal.device in (FAN, FAN_BASELINE) else float
+                ))
+                num_analog += 1
+
+        # Index the ADC channel of each ADC signal, counted as 8 * chip + pin, at which its raw
+        # codes are held in the state records
+        self.adc_channels = {
+            signal.name: 8 * signal.pin[0] + signal.pin[1]
+            for signal in self.SIGNALS if signal.device == ADC
+        }
+
+        # Preallocate the pool of state records. The current record is never modified; each update
+        # fills the next free record and then makes it current.
+        self.state = PSCUSoloState(num_analog, num_status, 8 * len(self.adc))
+        self.free_states = deque(
+            PSCUSoloState(num_analog, num_status, 8 * len(self.adc))
+            for _ in range(self.STATE_POOL_SIZE - 1)
+        )
 
-        self.update()
+        # Build the masks of ADC channels and input pins in use on each device, both overall to
+        # set up the pins and per scan class for the scan transactions. The ADC masks are 0x4d and
+        # 0xfc for the current signal table.
+        self.adc_masks = [0] * len(self.adc)
+        self.gpio_masks = [0] * len(self.mcp)
+        self.scan_masks = {
+            scan: {ADC: [0] * len(self.adc), GPIO: [0] * len(self.mcp)} for scan in SCAN_CLASSES
+        }
+        for signal in self.SIGNALS:
+            if signal.device == ADC:
+                (adc_idx, pin) = signal.pin
+                self.adc_masks[adc_idx] |= (1 << pin)
+                self.scan_masks[signal.scan][ADC][adc_idx] |= (1 << pin)
+            elif signal.device == GPIO:
+                (mcp_idx, pin) = signal.pin
+                self.gpio_masks[mcp_idx] |= (1 << pin)
+                self.scan_masks[signal.scan][GPIO][mcp_idx] |= (1 << pin)
+
+        for (adc, mask) in zip(self.adc, self.adc_masks):
+            adc.setup_adc(mask)
+
+        for (mcp, mask) in zip(self.mcp, self.gpio_masks):
+            for pin in range(8):
+                if mask & (1 << pin):
+                    mcp.setup(pin, MCP23008.IN)
+
+        for (pin_name, (mcp_idx, pin)) in self.OUTPUT_PINS.items():
+            self.mcp[mcp_idx].setup(pin, MCP23008.OUT)
+
+        # Raw ADC codes, flattened to eight channels per chip, and GPIO port values captured by
+        # the scan transactions, along with the number of failed ADC sequence and GPIO port reads
+        # of each chip
+        self.adc_values = [0] * (8 * len(self.adc))
+        self.adc_errors = [0] * len(self.adc)
+        self.gpio_ports = [0] * len(self.mcp)
+        self.gpio_errors = [0] * len(self.mcp)
 
-    def read_adc(self, adc_name):
-        """Will read a corresponding ADC pin after a value and index is given."""
-        (adc_idx, pin) = self.ADC_PINS[adc_name]
-        return self.adc[adc_idx].read_adc(pin)
+        self.plans = {}
 
-    def read_gpio(self, gpio_name):
-        """Will read a corresponding GPIO pin after a value and index is given."""
-        (mcp_idx, pin) = self.INPUT_PINS[gpio_name]
-        return self.mcp[mcp_idx].input(pin)
+        # Scan all classes, releasing the blank initial state record, which is never published
+        initial_state = self.state
+        self.update()
+        self.release_state(initial_state)
+
+    def value(self, name):
+        """Will return the current value of the named signal."""
+        return self.state_value(self.state, self.signal_index[name])
+
+    def state_value(self, state, idx):
+        """Will return the value of a signal in a state record.
+
+        :param state: state record
+        :param idx: index of the signal in the signal table
+        """
+        (is_status, offset, value_type) = self.layout[idx]
+        if is_status:
+            return value_type(state.status[offset])
+        return value_type(state.analog[offset])
+
+    def snapshot(self):
+        """Will return the current state record.
+
+        Every update and arming change makes a new record current and leaves the previous one
+        untouched, so the record returned can be treated as an immutable snapshot until it is
+        passed to release_state().
+        """
+        return self.state
+
+    def next_state(self):
+        """Will return a free state record initialised with a copy of the current state.
+
+        A new record is only allocated if the pool is exhausted, i.e. if superseded records are not
+        being released.
+        """
+        try:
+            state = self.free_states.popleft()
+        except IndexError:
+            state = PSCUSoloState(
+                len(self.state.analog), len(self.state.status), len(self.state.codes)
+            )
+        state.copy_from(self.state)
+        return state
+
+    def release_state(self, state):
+        """Will return a superseded state record to the pool for reuse.
+
+        :param state: record to release, which must no longer be current or referenced
+        """
+        if state is not self.state:
+            self.free_states.append(state)
+
+    def scan_plan(self, scans):
+        """Will return the plan to scan the specified classes.
+
+        Plans are built on first use for each combination of scan classes and cached.
+
+        :param scans: frozenset of scan classes to scan
+        """
+        plan = self.plans.get(scans)
+        if plan is None:
+            plan = self.build_plan(scans)
+            self.plans[scans] = plan
+        return plan
+
+    def build_plan(self, scans):
+        """Will build the plan to scan the specified classes from the signal table.
+
+        The plan holds the I2C transactions to run and flat tables of the state record offsets of
+        the signals to decode from their results. In bulk read mode there is one transaction per
+        device, otherwise one per pin. Either way the transactions store their results in the
+        adc_values and gpio_ports caches.
+
+        :param scans: iterable of scan classes to scan
+        """
+        plan = ScanPlan([], [], [], [], [], [])
+
+        adc_masks = [0] * len(self.adc)
+        gpio_masks = [0] * len(self.mcp)
+        for scan in scans:
+            for (adc_idx, mask) in enumerate(self.scan_masks[scan][ADC]):
+                adc_masks[adc_idx] |= mask
+            for (mcp_idx, mask) in enumerate(self.scan_masks[scan][GPIO]):
+                gpio_masks[mcp_idx] |= mask
+
+        for (adc_idx, mask) in enumerate(adc_masks):
+            if self.bulk_read and mask:
+                plan.transactions.append(ScanTransaction(
+                    self.ADC_MUX_CHANNEL, "adc{}".format(adc_idx),
+                    partial(self.read_adc_sequence, adc_idx, mask)
+                ))
+            elif mask:
+                plan.transactions.extend(
+                    ScanTransaction(
+                        self.ADC_MUX_CHANNEL, "adc{}.{}".format(adc_idx, pin),
+                        partial(self.read_adc_pin, adc_idx, pin)
+                    ) for pin in range(8) if mask & (1 << pin)
+                )
+
+        for (mcp_idx, mask) in enumerate(gpio_masks):
+            if self.bulk_read and mask:
+                plan.transactions.append(ScanTransaction(
+                    self.MCP_MUX_CHANNEL, "mcp{}".format(mcp_idx),
+                    partial(self.read_gpio_port, mcp_idx)
+                ))
+            elif mask:
+                plan.transactions.extend(
+                    ScanTransaction(
+                        self.MCP_MUX_CHANNEL, "mcp{}.{}".format(mcp_idx, pin),
+                        partial(self.read_gpio_pin, mcp_idx, pin)
+                    ) for pin in range(8) if mask & (1 << pin)
+                )
+
+        for (signal, (_, offset, _)) in zip(self.SIGNALS, self.layout):
+            if signal.scan not in scans:
+                continue
+            if signal.device == ADC:
+                channel = self.adc_channels[signal.name]
+                plan.adc.append((offset, channel, self.luts[signal.conversion]))
+            elif signal.device == GPIO:
+                (mcp_idx, pin) = signal.pin
+                plan.gpio.append((offset, mcp_idx, 1 << pin, signal.invert))
+            elif signal.device == FAN:
+                value = "rpm" if self.fan_period_mode else "rpm_short"
+                plan.fan.append((offset, signal.pin, value))
+            elif signal.device == FAN_BASELINE:
+                plan.fan.append((offset, signal.pin, "baseline_rpm"))
+            elif signal.device in self.FAN_FLAGS:
+                plan.fan_flags.append((offset, signal.pin, self.FAN_FLAGS[signal.device]))
+            elif signal.device == LOGIC:
+                inputs = [self.layout[self.signal_index[name]][1] for name in signal.pin]
+                plan.logic.append((offset, inputs, signal.conversion))
+
+        return plan
+
+    def read_adc_pin(self, adc_idx, pin):
+        """Will request a single conversion of an ADC pin and store the result.
+
+        The code is clamped to the ADC range so that it can be used directly as a table index.
+        """
+        adc_val = self.adc[adc_idx].read_adc(pin)
+        self.adc_values[8 * adc_idx + pin] = min(max(adc_val, 0), ADC_CODES - 1)
+
+    def read_adc_sequence(self, adc_idx, mask):
+        """Will convert the masked ADC channels of an AD5593R with one sequence and one block read.
+
+        The sequence register is loaded with the channel mask, then all results are read back in
+        a single transfer. Each result word carries its channel number in bits 14:12 alongside the
+        12-bit conversion value.
+
+        I2CDevice reports a failed transfer by returning -1 rather than raising. In that case, or
+        if the readback is short, the error is counted and the previous codes of the chip are
+        kept, so that the rest of the update is still published.
+        """
+        base = 8 * adc_idx
+        sequence = [(mask >> 8) & 0xff, mask & 0xff]
+        length = 2 * bin(mask).count("1")
+
+        data = -1
+        if self.adc[adc_idx].writeList(self.ADC_SEQ_REG, sequence) != -1:
+            data = self.adc[adc_idx].readList(self.ADC_READBACK, length)
+        if not isinstance(data, list) or len(data) != length:
+            self.adc_errors[adc_idx] += 1
+            return
+
+        for idx in range(0, len(data), 2):
+            word = (data[idx] << 8) | data[idx + 1]
+            self.adc_values[base + ((word >> 12) & 0x7)] = word & 0xfff
+
+    def read_gpio_pin(self, mcp_idx, pin):
+        """Will read a single GPIO pin and store it in the port value for its expander."""
+        if self.mcp[mcp_idx].input(pin):
+            self.gpio_ports[mcp_idx] |= (1 << pin)
+        else:
+            self.gpio_ports[mcp_idx] &= ~(1 << pin)
+
+    def read_gpio_port(self, mcp_idx):
+        """Will read the whole GPIO port of an MCP23008 in a single transaction.
+
+        I2CDevice reports a failed read by returning -1, which would otherwise decode as every
+        pin high. In that case the error is counted and the previous port value is kept.
+        """
+        port = self.mcp[mcp_idx].readU8(MCP23008.GPIO)
+        if port == -1:
+            self.gpio_errors[mcp_idx] += 1
+            return
+
+        self.gpio_ports[mcp_idx] = port
 
     def write_gpio(self, gpio_name, value):
         """Will write a corresponding GPIO pin after a value and index is given."""
         (mcp_idx, pin) = self.OUTPUT_PINS[gpio_name]
         self.mcp[mcp_idx].output(pin, value)
 
-    def update(self):
-        """Will update all of the values taken from the IO pins."""
-        self.armed = self.read_gpio("armed")
-        self.tripped = not self.read_gpio("tripped")
-        self.overall = (
-            self.temp_healthy and self.humid_healthy and self.leak_healthy and self.pump_healthy
-        )
-        self.latched = (
-            self.temp_latched or self.humid_latched or self.leak_latched or self.pump_latched
-        )
+    def update(self, scans=SCAN_CLASSES):
+        """Will update the values of the signals in the specified scan classes.
+
+        Only the pins in the specified classes are read from the devices. Values in other classes
+        keep the state from the last time their class was scanned.
+
+        :param scans: iterable of scan classes to update, defaults to all classes
+        """
+        plan = self.scan_plan(frozenset(scans))
+        self.planner.run(plan.transactions)
+
+        if plan.fan or plan.fan_flags:
+            self.update_fans()
+
+        state = self.next_state()
+        analog = state.analog
+        status = state.status
+        adc_values = self.adc_values
+        gpio_ports = self.gpio_ports
+
+        codes = state.codes
+        for (offset, channel, lut) in plan.adc:
+            code = adc_values[channel]
+            codes[channel] = code
+            analog[offset] = lut[code]
+
+        for (offset, mcp_idx, mask, invert) in plan.gpio:
+            status[offset] = (gpio_ports[mcp_idx] & mask != 0) != invert
+
+        for (offset, fan_idx, value) in plan.fan:
+            analog[offset] = getattr(self.fans[fan_idx], value)
+
+        for (offset, fan_idx, flag) in plan.fan_flags:
+            status[offset] = getattr(self.fans[fan_idx], flag)
+
+        for (offset, inputs, conversion) in plan.logic:
+            status[offset] = conversion([status[input_offset] for input_offset in inputs])
 
-        self.update_temp()
-        self.update_humid()
-        self.update_leak()
-        self.update_pump()
-        self.update_fans()
-
-    def update_temp(self):
-        """Will pdate all of the basic temp values."""
-        self.temp_healthy = self.read_gpio("temp_healthy")
-        self.temp_latched = not self.read_gpio("temp_latched")
-        self.update_temp1()
-        self.update_temp2()
-
-    def update_temp1(self):
-        """Will update all of the internal temp values."""
-        adc_val = self.read_adc("temp1_value")
-        self.temp1 = temp1_adc(adc_val)
-        self.temp1_raw = temp1_raw_adc(adc_val)
-        adc_val = self.read_adc("temp1_sp_under")
-        self.temp1_sp_under = temp1_adc(adc_val)
-        self.temp1_sp_under_raw = temp1_raw_adc(adc_val)
-        self.temp1_trip_over = not self.read_gpio("temp1_over")
-        self.temp1_trip_under = not self.read_gpio("temp1_under")
-        adc_val = self.read_adc("temp1_sp_over")
-        self.temp1_sp_over = temp1_adc(adc_val)
-        self.temp1_sp_over_raw = temp1_raw_adc(adc_val)
-
-    def update_temp2(self):
-        """Will update all of the coolant temp values."""
-        adc_val = self.read_adc("temp2_value")
-        self.temp2 = temp2_adc(adc_val)
-        self.temp2_raw = temp2_raw_adc(adc_val)
-        adc_val = self.read_adc("temp2_sp_under")
-        self.temp2_sp_under = temp2_adc(adc_val)
-        self.temp2_sp_under_raw = temp2_raw_adc(adc_val)
-        self.temp2_trip_over = not self.read_gpio("temp2_over")
-        self.temp2_trip_under = not self.read_gpio("temp2_under")
-        adc_val = self.read_adc("temp2_sp_over")
-        self.temp2_sp_over = temp2_adc(adc_val)
-        self.temp2_sp_over_raw = temp2_raw_adc(adc_val)
-
-    def update_humid(self):
-        """Will update all of the humidity values."""
-        adc_val = self.read_adc("humidity_value")
-        self.humidity = humid_adc(adc_val)
-        self.humid_raw = humid_raw_adc(adc_val)
-        adc_val = self.read_adc("humidity_sp")
-        self.humid_sp = humid_adc(adc_val)
-        self.humid_sp_raw = humid_raw_adc(adc_val)
-        self.humid_trip_over = not self.read_gpio("humid_over")
-        self.humid_healthy = self.read_gpio("humid_healthy")
-        self.humid_latched = not self.read_gpio("humid_latched")
-
-    def update_leak(self):
-        """Will update all of the leak values."""
-        self.leak = leak_adc(self.read_adc("leak_value"))
-        self.leak_sp = leak_adc(self.read_adc("leak_sp"))
-        self.leak_healthy = self.read_gpio("leak_healthy")
-        self.leak_latched = not self.read_gpio("leak_latched")
-        self.leak_trip_under = not self.read_gpio("leak_tripped")
-        self.leak_trace = self.read_gpio("leak_trace")
-
-    def update_pump(self):
-        """Will update  all of the pump states."""
-        self.pump_healthy = self.read_gpio("pump_healthy")
-        self.pump_trip = self.read_gpio("pump_trip")
-        self.pump_latched = not self.read_gpio("pump_latched")
+        state.seq += 1
+        state.timestamp = time.time()
+        state.mux_switches = self.planner.mux_switches
+        state.mux_switches_saved = self.planner.mux_switches_saved
+        self.state = state
 
     def set_armed(self, arm):
         """Will update all of the arming states."""
@@ -283,7 +580,17 @@ class PSCUSolo():
         self.write_gpio(pin, MCP23008.HIGH)
         self.write_gpio(pin, MCP23008.LOW)
 
-        self.armed = self.read_gpio("armed")
+        idx = self.signal_index["armed"]
+        (mcp_idx, pin) = self.SIGNALS[idx].pin
+        if self.bulk_read:
+            self.read_gpio_port(mcp_idx)
+        else:
+            self.read_gpio_pin(mcp_idx, pin)
+        state = self.next_state()
+        state.status[self.layout[idx][1]] = self.gpio_ports[mcp_idx] & (1 << pin) != 0
+        state.seq += 1
+        state.timestamp = time.time()
+        self.state = state
 
     def update_fans(self):
 
@@ -291,4 +598,4 @@ class PSCUSolo():
             for fan in self.fans:
                 fan.update()
 
-        self.fan_update_counter += 1
\ No newline at end of file
+        self.fan_update_counter += 1
@@ -0,0 +1,155 @@
+"""WebSocket push channel for the PSCUSolo.
+
+This module implements a WebSocket server, run alongside the odin-control REST API, that streams
+the changes in each published PSCUSolo snapshot to connected clients. Each message has the same
+form as a delta GET response, i.e. the snapshot sequence number and a sparse tree of the signals
+that have changed, so clients can merge it into their copy of the parameter tree.
+
+The delta of each update is encoded once and sent to all clients that are up to date. A client
+that is still sending an earlier message is skipped rather than queued for, and is sent a single
+catch-up delta from its own sequence number once its write completes, so that a slow client
+cannot stall the others or build up a backlog of messages.
+
+STFC Detector Systems Software Group
+"""
+import json
+import logging
+from urllib.parse import urlparse
+
+from tornado.ioloop import IOLoop
+from tornado.web import Application
+from tornado.websocket import WebSocketClosedError, WebSocketHandler
+
+
+class PushHandler(WebSocketHandler):
+    """WebSocket handler for a single push channel client."""
+
+    def initialize(self, server):
+        """Initialise the handler.
+
+        :param server: PushServer instance the handler belongs to
+        """
+        self.server = server
+        self.seq = 0
+        self.sending = False
+
+    def check_origin(self, origin):
+        """Accept connections from pages served by the same host on any port.
+
+        The push channel listens on its own port, so the dashboard served by odin-control is
+        always cross-origin by the default same host and port check.
+
+        :param origin: value of the Origin header of the request
+        """
+        return urlparse(origin).hostname == self.request.host_name
+
+    def open(self):
+        """Register the client and send it the full tree of signals."""
+        self.server.clients.add(self)
+        self.server.controller.invalidate_encoded()
+        logging.debug("Push client connected from %s", self.request.remote_ip)
+        self.server.send(self, *self.server.encode_delta(0))
+
+    def on_close(self):
+        """Unregister the client."""
+        self.server.clients.discard(self)
+        self.server.controller.invalidate_encoded()
+        logging.debug("Push client disconnected from %s", self.request.remote_ip)
+
+    def on_message(self, message):
+        """Ignore messages from the client; the channel is push only."""
+
+    async def send(self, seq, message):
+        """Send a message to the client, then catch up with any snapshots published meanwhile.
+
+        :param seq: snapshot sequence number the message brings the client up to
+        :param message: encoded message to send
+        """
+        self.sending = True
+        try:
+            while True:
+                await self.write_message(message)
+                self.seq = seq
+                if self.seq >= self.server.seq:
+                    break
+                (seq, message) = self.server.encode_delta(self.seq)
+        except WebSocketClosedError:
+            pass
+        finally:
+            self.sending = False
+
+
+class PushServer():
+    """WebSocket push channel server class.
+
+    This class runs a WebSocket server on the IOLoop of the controller and fans out the changes
+    in each snapshot published by the controller to the connected clients.
+    """
+
+    def __init__(self, controller, port):
+        """Initialise the push server and start listening for clients.
+
+        :param controller: PSCUSoloController instance whose snapshots are pushed
+        :param port: TCP port to listen on
+        """
+        self.controller = controller
+        self.port = port
+        self.clients = set()
+        self.seq = controller.snapshot.seq
+
+        self.app = Application([(r"/", PushHandler, {"server": self})])
+        self.http_server = self.app.listen(port)
+
+        logging.debug("PSCUSolo push channel listening on port %d", port)
+
+    def encode_delta(self, since):
+        """Encode a message of the signals changed since a snapshot.
+
+        :param since: snapshot sequence number
+        :return: tuple of the current snapshot sequence number and the encoded message
+        """
+        delta = self.controller.get_delta("", since)
+        return (delta["seq"], json.dumps(delta))
+
+    def send(self, client, seq, message):
+        """Start sending a message to a client in the background.
+
+        :param client: PushHandler instance to send to
+        :param seq: snapshot sequence number the message brings the client up to
+        :param message: encoded message to send
+        """
+        IOLoop.current().spawn_callback(client.send, seq, message)
+
+    def publish(self, snapshot):
+        """Push the changes in a newly published snapshot to the connected clients.
+
+        Clients up to date with the previous snapshot share a single encoded delta, which is not
+        sent at all if no signals have changed. Clients that are behind are sent their own delta,
+        and clients still sending an earlier message catch up when it completes.
+
+        :param snapshot: PSCUSoloState record that has been published
+        """
+        (previous_seq, self.seq) = (self.seq, snapshot.seq)
+        if self.seq == previous_seq or not self.clients:
+            return
+
+        shared = None
+        for client in self.clients:
+            if client.sending:
+                continue
+            if client.seq != previous_seq:
+                self.send(client, *self.encode_delta(client.seq))
+                continue
+            if shared is None:
+                delta = self.controller.get_delta("", previous_seq)
+                shared = (delta["seq"], json.dumps(delta) if delta["values"] else None)
+            if shared[1] is None:
+                client.seq = shared[0]
+            else:
+                self.send(client, *shared)
+
+    def stop(self):
+        """Stop listening for clients and close the open connections."""
+        self.http_server.stop()
+        for client in list(self.clients):
+            client.close()
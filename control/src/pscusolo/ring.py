@@ -0,0 +1,88 @@
+"""Ring buffer indexing for the PSCUSolo histories.
+
+This module implements the slot bookkeeping and timestamp search shared by the fixed-capacity,
+time-ordered ring buffers of the PSCUSolo histories. The buffers hold their records in
+preallocated arrays indexed by slot; this module maps between slots and indices counted from the
+oldest record, and finds records by timestamp with a binary search.
+
+STFC Detector Systems Software Group
+"""
+from abc import ABC, abstractmethod
+from typing import Callable
+
+
+def bisect_times(
+    time_at: Callable[[int], float], low: int, high: int, timestamp: float, after: bool = False
+) -> int:
+    """Return the index of the first record at, or after, a timestamp.
+
+    :param time_at: function returning the timestamp of the record at an index
+    :param low: index of the first record to search
+    :param high: index after the last record to search
+    :param timestamp: timestamp to search for
+    :param after: find the first record after the timestamp, rather than at or after it
+    """
+    while low < high:
+        mid = (low + high) // 2
+        recorded = time_at(mid)
+        if recorded < timestamp or (after and recorded == timestamp):
+            low = mid + 1
+        else:
+            high = mid
+
+    return low
+
+
+class RingBuffer(ABC):
+    """Time-ordered ring buffer base class.
+
+    This class holds the slot bookkeeping of a ring buffer of capacity records, of which count
+    are filled, the next record being written at the head slot. Subclasses hold the records and
+    give the timestamp of the record in a slot.
+    """
+
+    def __init__(self, capacity: int):
+        """Initialise the ring buffer.
+
+        :param capacity: number of records to hold
+        """
+        self.capacity = max(1, capacity)
+
+        # Index of the slot the next record is written in and the number of slots filled
+        self.head = 0
+        self.count = 0
+
+    def advance(self) -> int:
+        """Claim the slot for the next record, overwriting the oldest if the buffer is full.
+
+        :return: slot to write the record in
+        """
+        slot = self.head
+        self.head = (slot + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+        return slot
+
+    def slot(self, idx: int) -> int:
+        """Return the buffer slot of a record, indexed from the oldest.
+
+        :param idx: index of the record, from zero for the oldest
+        """
+        return (self.head - self.count + idx) % self.capacity
+
+    @abstractmethod
+    def time_at(self, slot: int) -> float:
+        """Return the timestamp of the record in a slot.
+
+        :param slot: buffer slot of the record
+        """
+
+    def bisect(self, timestamp: float, after: bool = False) -> int:
+        """Return the index of the first record at, or after, a timestamp.
+
+        :param timestamp: timestamp to search for
+        :param after: find the first record after the timestamp, rather than at or after it
+        """
+        return bisect_times(
+            lambda idx: self.time_at(self.slot(idx)), 0, self.count, timestamp, after
+        )
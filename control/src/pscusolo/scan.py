@@ -0,0 +1,113 @@
+"""Mux-aware I2C scan planning for the PSCUSolo.
+
+This module implements a planner for the I2C transactions of a PSCUSolo update cycle. All devices
+sit behind a TCA9548 multiplexer, which by default is reselected before every device access. The
+planner takes over channel selection for the devices attached through it, caching the currently
+selected channel so that the mux is only written when the channel actually changes, and orders
+each cycle's transactions so that those on the same channel are run together.
+
+STFC Detector Systems Software Group
+"""
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+
+class ScanTransaction(NamedTuple):
+    """A single I2C transaction in an update cycle, run on the specified mux channel."""
+
+    channel: int
+    name: str
+    action: Callable[[], None]
+
+
+class ScanPlanner:
+    """Mux-aware I2C scan planner class.
+
+    This class orders and runs the I2C transactions of an update cycle, grouping them by TCA9548
+    channel, and counts the number of mux switches performed and saved in each cycle.
+    """
+
+    def __init__(self, tca):
+        """Initialise the scan planner.
+
+        :param tca: TCA9548 multiplexer instance the planned devices are attached to
+        """
+        self.tca = tca
+        self.selected_channel: Optional[int] = None
+        self._device_channels: Dict[object, int] = {}
+
+        # Counters of channel selections requested by device accesses and actually performed
+        self._selects = 0
+        self._switches = 0
+
+        # Mux switches performed and saved by the planner in the last cycle
+        self.mux_switches = 0
+        self.mux_switches_saved = 0
+
+    def attach_device(self, channel: int, device, *args, **kwargs):
+        """Attach a device to the multiplexer with channel selection handled by the planner.
+
+        The device is attached to the TCA9548 as normal, then its pre-access hook is replaced so
+        that channel selection goes through the planner's cached select().
+
+        :param channel: TCA9548 channel the device is connected to
+        :param device: device class (or instance) to attach
+        :return: the attached device instance
+        """
+        device = self.tca.attach_device(channel, device, *args, **kwargs)
+        self._device_channels[device] = channel
+        device.pre_access = self._pre_access
+        return device
+
+    def _pre_access(self, device) -> None:
+        """Select the mux channel for a device ahead of an access to it.
+
+        :param device: device about to be accessed
+        """
+        self.select(self._device_channels[device])
+
+    def select(self, channel: int) -> None:
+        """Select a mux channel, only writing to the TCA9548 if the channel has changed.
+
+        If the write fails, which I2CDevice reports by returning -1 rather than raising, the cached
+        channel is discarded so that the next access reselects.
+
+        :param channel: channel to select
+        """
+        self._selects += 1
+        if channel == self.selected_channel:
+            return
+
+        self.selected_channel = None
+        self._switches += 1
+        if self.tca.write8(0, 1 << channel) != -1:
+            self.selected_channel = channel
+
+    def plan(self, transactions: Iterable[ScanTransaction]) -> List[ScanTransaction]:
+        """Order transactions to keep mux switches to a minimum.
+
+        Transactions are grouped by channel, starting with any on the currently selected channel.
+        The order of transactions within each channel is preserved.
+
+        :param transactions: transactions to order
+        :return: list of ordered transactions
+        """
+        return sorted(
+            transactions,
+            key=lambda transaction: (
+                transaction.channel != self.selected_channel, transaction.channel
+            )
+        )
+
+    def run(self, transactions: Iterable[ScanTransaction]) -> None:
+        """Run the transactions of an update cycle in planned order.
+
+        :param transactions: transactions to run
+        """
+        self._selects = 0
+        self._switches = 0
+
+        for transaction in self.plan(transactions):
+            transaction.action()
+
+        self.mux_switches = self._switches
+        self.mux_switches_saved = self._selects - self._switches
@@ -0,0 +1,422 @@
+"""Persistent on-disk history of PSCUSolo snapshots.
+
+This module implements a history store that survives adapter restarts and power cycles. The
+values of each published snapshot are recorded in a preallocated, memory-mapped file of
+fixed-size records used as a ring buffer. All fields are little-endian:
+
+    header:  two copies, each of the magic, format version, CRC of the signal names, record
+             capacity, number of analog and status values, header sequence number, number of
+             the next record to be written and a CRC of the copy, padded to HEADER_COPY_SIZE
+             bytes
+    records: uint64 record number, uint64 snapshot sequence number, float64 timestamp, one
+             float64 per analog signal and one byte per status signal in signal table order,
+             followed by a CRC32 of the record
+
+Records are numbered from zero over the life of the file and record N is held in slot N modulo
+the capacity. To limit SD card wear, records are batched in memory and written to the file when
+the batch is full or the flush interval has elapsed. Writing the batch only copies it into the
+mapping; syncing the records to the card, then updating the header to cover them and syncing
+that, is a separate step that its owner can run off the IOLoop. Header updates alternate between
+the two copies, so a torn header write leaves the previous copy intact; should neither copy be
+valid, the newest record is found by scanning the records. On opening, records written after
+the last header update are recovered by scanning forward while the record numbers and CRCs are
+valid, so a torn write loses at most the record being written. The file is only recreated if its
+magic, layout or capacity do not match the store. Reads go directly through the mmap; with
+numpy, the whole file can be viewed as a structured array without copying.
+
+STFC Detector Systems Software Group
+"""
+import logging
+import mmap
+import os
+import struct
+import zlib
+from types import ModuleType
+from typing import Dict, Iterable, Optional
+
+from pscusolo.ring import bisect_times
+
+np: Optional[ModuleType]
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class HistoryStore:
+    """Memory-mapped history store class.
+
+    This class records PSCUSolo state records into a memory-mapped history file and answers
+    time-range queries of the recorded values of selected signals.
+    """
+
+    MAGIC = b"PSCUHIST"
+    VERSION = 2
+
+    HEADER = struct.Struct("<8sIIQIIQQ")
+    HEADER_CRC = struct.Struct("<I")
+    HEADER_COPY_SIZE = 64
+    HEADER_SIZE = 2 * HEADER_COPY_SIZE
+
+    def __init__(
+        self, path: str, pscu, capacity: int, batch_size: int = 256, flush_interval: float = 60.0
+    ):
+        """Initialise the store, opening or creating the history file.
+
+        A file created for a different format, signal layout or capacity is recreated.
+
+        :param path: path of the history file
+        :param pscu: PSCUSolo instance whose state records are to be recorded
+        :param capacity: number of records held in the file
+        :param batch_size: maximum number of records batched in memory before writing
+        :param flush_interval: maximum time in seconds records are batched before writing
+        """
+        self.path = path
+        self.pscu = pscu
+        self.capacity = max(1, capacity)
+        self.batch_size = max(1, min(batch_size, self.capacity))
+        self.flush_interval = flush_interval
+
+        self.num_analog = sum(1 for (is_status, _, _) in pscu.layout if not is_status)
+        self.num_status = len(pscu.layout) - self.num_analog
+        self.layout_crc = zlib.crc32(
+            ",".join(signal.name for signal in pscu.SIGNALS).encode("utf-8")
+        )
+
+        self.record = struct.Struct("<QQd{}d{}s".format(self.num_analog, self.num_status))
+        self.record_crc = struct.Struct("<I")
+        self.record_size = self.record.size + self.record_crc.size
+        self.timestamp_field = struct.Struct("<d")
+        self.timestamp_offset = 16
+        self.analog_offset = 24
+        self.status_offset = self.analog_offset + 8 * self.num_analog
+
+        # Batch of records pending writing to the file
+        self.batch = bytearray(self.batch_size * self.record_size)
+        self.batch_count = 0
+        self.last_flush: Optional[float] = None
+
+        # Sequence number of the last header written, selecting the copy written next
+        self.header_seq = 0
+
+        # Open the file, validating its header if it is of the expected size, otherwise
+        # (re)creating it zero-filled and preallocated
+        size = self.HEADER_SIZE + self.capacity * self.record_size
+        self.file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+        next_count = None
+        if os.fstat(self.file.fileno()).st_size == size:
+            self.mmap = mmap.mmap(self.file.fileno(), size)
+            next_count = self.read_header()
+            if next_count is None:
+                logging.warning("Recreating history file %s for a different layout", path)
+                self.mmap.close()
+
+        if next_count is None:
+            self.file.truncate(0)
+            self.file.truncate(size)
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(self.file.fileno(), 0, size)
+            self.mmap = mmap.mmap(self.file.fileno(), size)
+            next_count = 0
+
+        # Number of the next record to be written to the file, recovered from the header and
+        # any complete records written after the header was last updated
+        self.flushed_count = self.recover(next_count)
+        self.write_header()
+
+        logging.debug(
+            "History file %s opened with %d of %d records", path, self.count, self.capacity
+        )
+
+    @property
+    def next_count(self) -> int:
+        """Return the number of the next record, including those in the batch."""
+        return self.flushed_count + self.batch_count
+
+    @property
+    def count(self) -> int:
+        """Return the number of records held."""
+        return min(self.next_count, self.capacity)
+
+    def read_header(self) -> Optional[int]:
+        """Read and validate the file header.
+
+        The valid copy of the header with the highest sequence number is used. If neither copy
+        is valid but either matches the store, the number of the next record is found by
+        scanning the records.
+
+        :return: number of the next record, or None if the file does not match the store
+        """
+        identity = (
+            self.MAGIC, self.VERSION, self.layout_crc, self.capacity,
+            self.num_analog, self.num_status
+        )
+        headers = []
+        matched = False
+        for copy in range(2):
+            offset = copy * self.HEADER_COPY_SIZE
+            fields = self.HEADER.unpack_from(self.mmap, offset)
+            (crc,) = self.HEADER_CRC.unpack_from(self.mmap, offset + self.HEADER.size)
+            if crc == zlib.crc32(self.mmap[offset:offset + self.HEADER.size]):
+                if fields[:6] != identity:
+                    return None
+                headers.append(fields[6:])
+            elif fields[:6] == identity:
+                matched = True
+
+        if headers:
+            (self.header_seq, next_count) = max(headers)
+            return next_count
+        if matched:
+            logging.warning("History file %s header is invalid, scanning records", self.path)
+            return self.scan()
+        return None
+
+    def write_header(self, count: Optional[int] = None) -> None:
+        """Write the file header and sync it to the file.
+
+        The header is written to the copy not holding the last header written, so that the
+        last remains valid should this write be torn.
+
+        :param count: number of the next record to record in the header, the next record to be
+                      written to the file if None
+        """
+        if count is None:
+            count = self.flushed_count
+        self.header_seq += 1
+        offset = (self.header_seq % 2) * self.HEADER_COPY_SIZE
+        self.HEADER.pack_into(
+            self.mmap, offset, self.MAGIC, self.VERSION, self.layout_crc, self.capacity,
+            self.num_analog, self.num_status, self.header_seq, count
+        )
+        self.HEADER_CRC.pack_into(
+            self.mmap, offset + self.HEADER.size,
+            zlib.crc32(self.mmap[offset:offset + self.HEADER.size])
+        )
+        self.sync_file()
+
+    def sync_file(self) -> None:
+        """Sync the mapped file to the card.
+
+        The file is synced through its descriptor rather than with mmap.flush(), which holds
+        the GIL for the duration; the pages of a shared mapping are in the page cache, so are
+        synced either way.
+        """
+        if hasattr(os, "fdatasync"):
+            os.fdatasync(self.file.fileno())
+        else:
+            os.fsync(self.file.fileno())
+
+    def recover(self, next_count: int) -> int:
+        """Recover the complete records written after the header was last updated.
+
+        :param next_count: number of the next record according to the header
+        :return: number of the next record after the last complete one
+        """
+        for _ in range(self.capacity):
+            offset = self.offset(next_count)
+            (record_no,) = struct.unpack_from("<Q", self.mmap, offset)
+            if record_no != next_count or not self.valid(offset):
+                break
+            next_count += 1
+
+        return next_count
+
+    def scan(self) -> int:
+        """Find the newest valid record in the file, for when neither header copy is valid.
+
+        :return: number of the record after the newest valid record, zero if there are none
+        """
+        next_count = 0
+        for slot in range(self.capacity):
+            offset = self.offset(slot)
+            (record_no,) = struct.unpack_from("<Q", self.mmap, offset)
+            if (record_no % self.capacity == slot and record_no >= next_count
+                    and self.valid(offset)):
+                next_count = record_no + 1
+
+        return next_count
+
+    def offset(self, record_no: int) -> int:
+        """Return the offset in the file of a record.
+
+        :param record_no: record number
+        """
+        return self.HEADER_SIZE + (record_no % self.capacity) * self.record_size
+
+    def valid(self, offset: int) -> bool:
+        """Return true if the CRC of the record at an offset in the file is valid.
+
+        :param offset: offset of the record
+        """
+        (crc,) = self.record_crc.unpack_from(self.mmap, offset + self.record.size)
+        return crc == zlib.crc32(self.mmap[offset:offset + self.record.size])
+
+    def record_state(self, state) -> bool:
+        """Add the values of a state record to the batch.
+
+        :param state: PSCUSoloState record to record
+        :return: true if the batch is due to be written, i.e. is full or the flush interval has
+                 elapsed
+        """
+        offset = self.batch_count * self.record_size
+        self.record.pack_into(
+            self.batch, offset, self.next_count, state.seq, state.timestamp,
+            *state.analog, bytes(state.status)
+        )
+        self.record_crc.pack_into(
+            self.batch, offset + self.record.size,
+            zlib.crc32(memoryview(self.batch)[offset:offset + self.record.size])
+        )
+        self.batch_count += 1
+
+        if self.last_flush is None:
+            self.last_flush = state.timestamp
+        return (self.batch_count == self.batch_size
+                or state.timestamp - self.last_flush >= self.flush_interval)
+
+    def write_batch(self, timestamp: Optional[float] = None) -> int:
+        """Copy the batched records into the mapped file, without syncing it.
+
+        The records are readable from the mapping straight away, but are only covered by the
+        header once sync() has been called with the returned record number.
+
+        :param timestamp: time of the write, used to schedule the next
+        :return: number of the next record after those written
+        """
+        batch = memoryview(self.batch)
+        for idx in range(self.batch_count):
+            offset = self.offset(self.flushed_count + idx)
+            self.mmap[offset:offset + self.record_size] = (
+                batch[idx * self.record_size:(idx + 1) * self.record_size]
+            )
+
+        self.flushed_count += self.batch_count
+        self.batch_count = 0
+        self.last_flush = timestamp
+
+        return self.flushed_count
+
+    def sync(self, count: int) -> None:
+        """Sync the records written to the file, then update the header to cover them.
+
+        This may be called on another thread while further records are batched and written;
+        calls must not overlap.
+
+        :param count: number of the next record after those to cover, as returned by write_batch()
+        """
+        self.sync_file()
+        self.write_header(count)
+
+    def flush(self, timestamp: Optional[float] = None) -> None:
+        """Write the batched records to the file, then update the header to cover them.
+
+        :param timestamp: time of the flush, used to schedule the next
+        """
+        self.sync(self.write_batch(timestamp))
+
+    def close(self) -> None:
+        """Write any batched records and close the file."""
+        self.flush()
+        self.mmap.close()
+        self.file.close()
+
+    def locate(self, record_no: int):
+        """Return the buffer holding a record and its offset in it.
+
+        :param record_no: record number
+        :return: tuple of the mmap or batch buffer and the offset of the record
+        """
+        if record_no >= self.flushed_count:
+            return (self.batch, (record_no - self.flushed_count) * self.record_size)
+        return (self.mmap, self.offset(record_no))
+
+    def timestamp(self, record_no: int) -> float:
+        """Return the timestamp of a record.
+
+        :param record_no: record number
+        """
+        (buf, offset) = self.locate(record_no)
+        return self.timestamp_field.unpack_from(buf, offset + self.timestamp_offset)[0]
+
+    def bisect(self, timestamp: float, after: bool = False) -> int:
+        """Return the number of the first record at, or after, a timestamp.
+
+        :param timestamp: timestamp to search for
+        :param after: find the first record after the timestamp, rather than at or after it
+        """
+        return bisect_times(
+            self.timestamp, self.next_count - self.count, self.next_count, timestamp, after
+        )
+
+    def query(
+        self, start: Optional[float] = None, end: Optional[float] = None,
+        names: Optional[Iterable[str]] = None, limit: Optional[int] = None
+    ) -> Dict[str, object]:
+        """Query the recorded values of signals over a time range.
+
+        The result has the same form as that of History.query(), with the addition of a flag
+        set if the records were truncated to the limit. The rest of the range may be queried by
+        starting at the timestamp of the last record returned.
+
+        :param start: optional timestamp of the start of the range, from the oldest if None
+        :param end: optional timestamp of the end of the range, to the newest if None
+        :param names: optional names of the signals to return, all signals if None
+        :param limit: optional maximum number of records to return, from the start of the range
+        :return: dict of lists of the sequence numbers and timestamps of the records in the
+                 range, and of the values of each signal, keyed by name, and the truncated flag
+        """
+        if names is None:
+            names = [signal.name for signal in self.pscu.SIGNALS]
+
+        columns = []
+        for name in names:
+            if name not in self.pscu.signal_index:
+                raise ValueError("Unknown signal: {}".format(name))
+            (is_status, offset, value_type) = self.pscu.layout[self.pscu.signal_index[name]]
+            if is_status:
+                columns.append((name, "<?", self.status_offset + offset, value_type))
+            else:
+                columns.append((name, "<d", self.analog_offset + 8 * offset, value_type))
+
+        first = self.bisect(start) if start is not None else self.next_count - self.count
+        last = self.bisect(end, after=True) if end is not None else self.next_count
+        truncated = False
+        if limit is not None and last - first > limit:
+            (last, truncated) = (first + limit, True)
+        records = [self.locate(record_no) for record_no in range(first, last)]
+
+        return {
+            "seq": [struct.unpack_from("<Q", buf, offset + 8)[0] for (buf, offset) in records],
+            "timestamp": [
+                self.timestamp_field.unpack_from(buf, offset + self.timestamp_offset)[0]
+                for (buf, offset) in records
+            ],
+            "values": {
+                name: [
+                    value_type(struct.unpack_from(fmt, buf, offset + field)[0])
+                    for (buf, offset) in records
+                ]
+                for (name, fmt, field, value_type) in columns
+            },
+            "truncated": truncated,
+        }
+
+    def records_array(self):
+        """Return a zero-copy numpy structured array view of the records in the file.
+
+        The array is indexed by slot, i.e. record number modulo the capacity, and includes the
+        batched records only once they have been written. This requires numpy.
+
+        :return: numpy structured array with record_no, seq, timestamp, analog, status and crc
+                 fields
+        """
+        if np is None:
+            raise ImportError("numpy is required for array views of the history file")
+
+        dtype = np.dtype([
+            ("record_no", "<u8"), ("seq", "<u8"), ("timestamp", "<f8"),
+            ("analog", "<f8", (self.num_analog,)), ("status", "u1", (self.num_status,)),
+            ("crc", "<u4"),
+        ])
+        return np.frombuffer(self.mmap, dtype=dtype, count=self.capacity, offset=self.HEADER_SIZE)
@@ -342,8 +342,13 @@ $(document).ready(function() {
     global_elems.set("overall-fan2", document.querySelector("#overall-fan2"));
     global_elems.set("arm", document.querySelector("#button-arm"));
 
-    //Start update function
-    setInterval(updateAll, 500);
+    //Start updates, pushed by the adapter if it has a push channel, otherwise polled
+    $.getJSON('/api/0.1/pscusolo/push/port', function(response) {
+        if (response.port && window.WebSocket)
+            connectPush(response.port);
+        else
+            startPolling();
+    }).fail(startPolling);
 });
 
 function update_status_box(el, value, text_true, text_false)
@@ -352,6 +357,13 @@ function update_status_box(el, value, text_true, text_false)
     el.innerHTML = value ? text_true : text_false;
 }
 
+function fan_status(fan)
+{
+    if(fan.stalled)
+        return "Stalled";
+    return fan.value + "&nbsp;rpm" + (fan.degraded ? "&nbsp;(degraded)" : "");
+}
+
 function update_button_state(el, value, text_true, text_false)
 {
     el.classList.add(value ? buttonOn : buttonOff);
@@ -359,51 +371,96 @@ function update_button_state(el, value, text_true, text_false)
     el.innerHTML = value ? text_true : text_false;
 }
 
-function updateAll()
-{
-    $.getJSON('/api/0.1/pscusolo/', function(response) {
-
-        //Handle temp sensors
-        for(var i = 0; i < temp_sensors.length; ++i)
-            temp_sensors[i].update(response.temperature.sensors[i]);
+//Local copy of the parameter tree and the epoch and snapshot sequence number it is up to date with
+var model = {};
+var model_epoch = "";
+var model_seq = 0;
+var poll_timer = null;
 
-        //Handle humidity sensors
-        for(var i = 0; i < humidity_sensors.length; ++i)
-            humidity_sensors[i].update(response.humidity.sensors[i]);
-
-        for(var i = 0; i < leak_sensors.length; ++i)
-            leak_sensors[i].update(response.leak.sensors[i]);
-
-        for(var i = 0; i < fan_sensors.length; ++i)
-            fan_sensors[i].update(response.fans.sensors[i])
-
-        //Handle overall status
-        update_status_box(global_elems.get("overall-status"), response.overall, 'Healthy', 'Error');
-        update_status_box(global_elems.get("overall-latched"), !response.latched, 'No', 'Yes');
-        update_status_box(global_elems.get("overall-tripped"), !response.tripped, 'No', 'Yes');
-        update_status_box(global_elems.get("overall-armed"), response.armed, 'Yes', 'No');
+function mergeDelta(target, source)
+{
+    for (var key in source)
+    {
+        if (source[key] !== null && typeof source[key] === 'object' && key in target)
+            mergeDelta(target[key], source[key]);
+        else
+            target[key] = source[key];
+    }
+}
 
-        global_elems.get("overall-fan1").innerHTML = response.fans.sensors[0].value + "&nbsp;rpm";
-        global_elems.get("overall-fan2").innerHTML = response.fans.sensors[1].value + "&nbsp;rpm";
+function updateAll()
+{
+    //Only fetch the values that have changed since the last update
+    $.getJSON('/api/0.1/pscusolo/?since=' + model_seq + '&epoch=' + model_epoch, applyDelta);
+}
 
-        // Handle health states
-        update_status_box(global_elems.get("tmp-health"), response.temperature.healthy, 'Healthy', 'Error');
-        update_status_box(global_elems.get("h-health"), response.humidity.healthy, 'Healthy', 'Error');
-        update_status_box(global_elems.get("l-health"),response.leak.healthy, 'Healthy', 'Error');
-        update_status_box(global_elems.get("p-health"), response.pump.healthy, 'Healthy', 'Error');
+function applyDelta(response)
+{
+    mergeDelta(model, response.values);
+    model_epoch = response.epoch;
+    model_seq = response.seq;
+    render(model);
+}
 
-         // Handle latched states
-        update_status_box(global_elems.get("tmp-latched"), !response.temperature.latched, 'No', 'Yes');
-        update_status_box(global_elems.get("h-latched"), !response.humidity.latched, 'No', 'Yes');
-        update_status_box(global_elems.get("l-latched"), !response.leak.latched, "No", "Yes");
-        update_status_box(global_elems.get("p-latched"), !response.pump.latched, 'No', 'Yes')
+function startPolling()
+{
+    if (poll_timer === null)
+        poll_timer = setInterval(updateAll, 500);
+}
 
-        // Handle pump trip state
-        update_status_box(global_elems.get("p-tripped"), !response.pump.sensors[0].pump_trip, 'No', 'Yes');
+function connectPush(port)
+{
+    //Each message is a delta of the signals changed since the last one; fall back to polling if
+    //the channel closes
+    var socket = new WebSocket(`ws://${window.location.hostname}:${port}/`);
+    socket.onmessage = function(event) {
+        applyDelta(JSON.parse(event.data));
+    };
+    socket.onclose = startPolling;
+}
 
-        // Handle button states
-        update_button_state(global_elems.get("arm"), response.armed, 'Disarm Interlock', 'Arm Interlock');
-    });
+function render(response)
+{
+    //Handle temp sensors
+    for(var i = 0; i < temp_sensors.length; ++i)
+        temp_sensors[i].update(response.temperature.sensors[i]);
+
+    //Handle humidity sensors
+    for(var i = 0; i < humidity_sensors.length; ++i)
+        humidity_sensors[i].update(response.humidity.sensors[i]);
+
+    for(var i = 0; i < leak_sensors.length; ++i)
+        leak_sensors[i].update(response.leak.sensors[i]);
+
+    for(var i = 0; i < fan_sensors.length; ++i)
+        fan_sensors[i].update(response.fans.sensors[i])
+
+    //Handle overall status
+    update_status_box(global_elems.get("overall-status"), response.overall, 'Healthy', 'Error');
+    update_status_box(global_elems.get("overall-latched"), !response.latched, 'No', 'Yes');
+    update_status_box(global_elems.get("overall-tripped"), !response.tripped, 'No', 'Yes');
+    update_status_box(global_elems.get("overall-armed"), response.armed, 'Yes', 'No');
+
+    global_elems.get("overall-fan1").innerHTML = fan_status(response.fans.sensors[0]);
+    global_elems.get("overall-fan2").innerHTML = fan_status(response.fans.sensors[1]);
+
+    // Handle health states
+    update_status_box(global_elems.get("tmp-health"), response.temperature.healthy, 'Healthy', 'Error');
+    update_status_box(global_elems.get("h-health"), response.humidity.healthy, 'Healthy', 'Error');
+    update_status_box(global_elems.get("l-health"),response.leak.healthy, 'Healthy', 'Error');
+    update_status_box(global_elems.get("p-health"), response.pump.healthy, 'Healthy', 'Error');
+
+     // Handle latched states
+    update_status_box(global_elems.get("tmp-latched"), !response.temperature.latched, 'No', 'Yes');
+    update_status_box(global_elems.get("h-latched"), !response.humidity.latched, 'No', 'Yes');
+    update_status_box(global_elems.get("l-latched"), !response.leak.latched, "No", "Yes");
+    update_status_box(global_elems.get("p-latched"), !response.pump.latched, 'No', 'Yes')
+
+    // Handle pump trip state
+    update_status_box(global_elems.get("p-tripped"), !response.pump.sensors[0].pump_trip, 'No', 'Yes');
+
+    // Handle button states
+    update_button_state(global_elems.get("arm"), response.armed, 'Disarm Interlock', 'Arm Interlock');
 }
 
 function armInterlock()
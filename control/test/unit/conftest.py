@@ -0,0 +1,188 @@
+"""Unit test fixtures for the PSCUSolo adapter.
+
+The PSCUSolo hardware is accessed through the Adafruit_BBIO and odin_devices packages, which
+only work on the target. Where they cannot be imported, minimal simulated devices are installed in
+their place, so that the signal acquisition, history and fan speed logic can be tested off-target.
+The simulated I2C devices count their accesses and, when their fail flag is set, report failed
+transfers by returning -1, as I2CDevice does.
+
+STFC Detector Systems Software Group
+"""
+import sys
+import types
+
+import pytest
+
+
+class SimulatedI2CDevice:
+    """Simulated odin_devices I2C device, which reads back zero unless overridden."""
+
+    @classmethod
+    def set_default_i2c_bus(cls, bus):
+        """Ignore the I2C bus selection."""
+
+    def __init__(self, address=0, **kwargs):
+        """Initialise the simulated device at an address."""
+        self.address = address
+        self.pre_access = None
+        self.fail = False
+        self.accesses = 0
+
+    def access(self, result):
+        """Run the pre-access hook and count an access, returning -1 instead of a failed result."""
+        if self.pre_access is not None:
+            self.pre_access(self)
+        self.accesses += 1
+        return -1 if self.fail else result
+
+    def write8(self, reg, value):
+        """Write a byte."""
+        return self.access(None)
+
+    def writeList(self, reg, data):
+        """Write a block."""
+        return self.access(None)
+
+    def readU8(self, reg):
+        """Read back a byte."""
+        return self.access(0)
+
+    def readList(self, reg, length):
+        """Read back a block."""
+        return self.access([0] * length)
+
+
+class SimulatedTCA9548(SimulatedI2CDevice):
+    """Simulated TCA9548 I2C multiplexer, which counts the channel selections written to it."""
+
+    def __init__(self, address=0x70, **kwargs):
+        """Initialise the simulated multiplexer."""
+        super().__init__(address)
+        self.selects = []
+
+    def attach_device(self, line, device, *args, **kwargs):
+        """Create a device attached to a multiplexer line."""
+        device = device(*args, **kwargs)
+        device.pre_access = lambda _: self.write8(0, 1 << line)
+        return device
+
+    def write8(self, reg, value):
+        """Select a channel."""
+        self.selects.append(value)
+        return self.access(None)
+
+
+class SimulatedAD5593R(SimulatedI2CDevice):
+    """Simulated AD5593R ADC, converting the codes set in its codes list."""
+
+    def __init__(self, address=0x10, **kwargs):
+        """Initialise the simulated ADC with all channels reading zero."""
+        super().__init__(address)
+        self.codes = [0] * 8
+        self.sequence = 0
+
+    def setup_adc(self, mask):
+        """Accept the ADC channel configuration."""
+
+    def read_adc(self, pin):
+        """Convert a single channel."""
+        return self.access(self.codes[pin])
+
+    def writeList(self, reg, data):
+        """Load the conversion sequence register."""
+        if reg == 0x02:
+            self.sequence = (data[0] << 8) | data[1]
+        return self.access(None)
+
+    def readList(self, reg, length):
+        """Read back the conversion results of the sequence, tagged with their channels."""
+        data = []
+        for channel in range(8):
+            if self.sequence & (1 << channel):
+                word = (channel << 12) | self.codes[channel]
+                data.extend((word >> 8, word & 0xff))
+        return self.access(data[:length])
+
+
+class SimulatedMCP23008(SimulatedI2CDevice):
+    """Simulated MCP23008 GPIO expander, reading back the pins set in its port value."""
+
+    GPIO = 0x09
+    IN = 1
+    OUT = 0
+    HIGH = 1
+    LOW = 0
+
+    def __init__(self, address=0x20, **kwargs):
+        """Initialise the simulated expander with all pins low."""
+        super().__init__(address)
+        self.port = 0
+
+    def setup(self, pin, direction):
+        """Accept the pin direction configuration."""
+
+    def input(self, pin):
+        """Read a single pin."""
+        return self.access(bool(self.port & (1 << pin)))
+
+    def output(self, pin, value):
+        """Write a single pin."""
+        return self.access(None)
+
+    def readU8(self, reg):
+        """Read the whole port."""
+        return self.access(self.port)
+
+
+def install_module(name, **attrs):
+    """Install a simulated module, and its parent packages, unless the real one is importable.
+
+    :param name: fully qualified module name
+    :param attrs: module attributes
+    """
+    try:
+        __import__(name)
+        return
+    except ImportError:
+        pass
+
+    parts = name.split(".")
+    for idx in range(1, len(parts)):
+        sys.modules.setdefault(".".join(parts[:idx]), types.ModuleType(".".join(parts[:idx])))
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    if len(parts) > 1:
+        setattr(sys.modules[".".join(parts[:-1])], parts[-1], module)
+
+
+install_module(
+    "Adafruit_BBIO.GPIO", IN=0, OUT=1, HIGH=1, LOW=0, RISING=1, FALLING=2, BOTH=3,
+    setup=lambda *args, **kwargs: None, add_event_detect=lambda *args, **kwargs: None
+)
+install_module("odin_devices.i2c_device", I2CDevice=SimulatedI2CDevice)
+install_module("odin_devices.tca9548", TCA9548=SimulatedTCA9548)
+install_module("odin_devices.ad5593r", AD5593R=SimulatedAD5593R)
+install_module("odin_devices.mcp23008", MCP23008=SimulatedMCP23008)
+
+
+@pytest.fixture
+def pscu():
+    """Return a PSCUSolo instance whose fans do not stall for the duration of a test."""
+    from pscusolo.pscusolo import PSCUSolo
+
+    return PSCUSolo(fan_stall_min_time=3600.0)
+
+
+@pytest.fixture
+def controller():
+    """Return a controller whose fans do not stall for the duration of a test.
+
+    The controller requires odin-control, so tests using it are skipped where that is missing.
+    """
+    pytest.importorskip("odin.adapters.parameter_tree")
+    from pscusolo.controller import PSCUSoloController
+
+    controller = PSCUSoloController(fan_stall_min_time=3600.0)
+    yield controller
+    controller.cleanup()
@@ -0,0 +1,48 @@
+"""Tests of the PSCUSolo adapter request handling."""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("odin.adapters.adapter")
+
+from pscusolo.adapter import accepts_packed, get_argument  # noqa: E402
+from pscusolo.encoding import SnapshotEncoder  # noqa: E402
+
+PACKED = SnapshotEncoder.CONTENT_TYPE
+
+
+def request(headers=None, **arguments):
+    """Return a stand-in for a tornado request with query arguments and headers."""
+    return SimpleNamespace(
+        query_arguments={name: [str(value).encode()] for (name, value) in arguments.items()},
+        headers=headers or {},
+    )
+
+
+def test_get_argument():
+    """Test that query arguments are decoded and converted, with a default if not given."""
+    assert get_argument(request(since="12"), "since", int) == 12
+    assert get_argument(request(), "since", int, 3) == 3
+    assert get_argument(request(fields="a,b"), "fields") == "a,b"
+
+
+def test_get_argument_invalid():
+    """Test that an invalid argument is reported with its decoded value."""
+    with pytest.raises(ValueError, match="^Invalid value for argument since: abc$"):
+        get_argument(request(since="abc"), "since", int)
+
+
+@pytest.mark.parametrize(("accept", "packed"), [
+    ("", False),
+    ("application/json", False),
+    (PACKED, True),
+    ("{}; q=0.9".format(PACKED), True),
+    ("{}, application/json".format(PACKED), True),
+    ("application/json, {}".format(PACKED), False),
+    ("*/*, {}".format(PACKED), False),
+    ("text/html, {}, */*".format(PACKED), True),
+    ("{}x".format(PACKED), False),
+])
+def test_accepts_packed(accept, packed):
+    """Test that the binary encoding is only selected when listed ahead of JSON and wildcards."""
+    assert accepts_packed(request({"Accept": accept})) == packed
@@ -0,0 +1,94 @@
+"""Tests of the PSCUSolo trip and latch capture buffer."""
+import pytest
+
+from pscusolo.capture import CaptureBuffer
+
+TRIGGERS = ["tripped", "temp_latched"]
+
+
+class Recorder:
+    """Records snapshots with set trigger signals in a capture buffer, 0.1 s apart."""
+
+    def __init__(self, pscu, buffer):
+        """Initialise the recorder with the current state record of a PSCUSolo."""
+        self.buffer = buffer
+        self.state = pscu.snapshot()
+        self.offsets = {name: pscu.layout[pscu.signal_index[name]][1] for name in TRIGGERS}
+        for offset in self.offsets.values():
+            self.state.status[offset] = 0
+
+    def step(self, count=1, **values):
+        """Record a number of snapshots, setting trigger signals in the first of them."""
+        for name, value in values.items():
+            self.state.status[self.offsets[name]] = value
+        for _ in range(count):
+            self.state.seq += 1
+            self.state.timestamp = round(self.state.seq * 0.1, 6)
+            active = self.buffer.record(self.state)
+        return active
+
+
+@pytest.fixture
+def recorder(pscu):
+    """Return a recorder into a capture buffer of 4 pre- and up to 20 post-trigger snapshots."""
+    return Recorder(pscu, CaptureBuffer(pscu, TRIGGERS, 4, 20, 1.0, 2))
+
+
+def test_no_capture_without_trigger(recorder):
+    """Test that no capture is made while the triggers are inactive."""
+    assert not recorder.step(10)
+    assert recorder.buffer.summaries() == []
+
+
+def test_capture_pre_and_post_trigger(recorder):
+    """Test that a capture holds the snapshots before the trigger and for the post period."""
+    recorder.step(6)
+    trigger_seq = recorder.state.seq + 1
+    assert recorder.step(tripped=1)
+    assert recorder.step(9)
+    assert not recorder.step()
+
+    result = recorder.buffer.query(1, ["tripped"])
+    assert result["triggers"] == ["tripped"]
+    assert result["complete"]
+    assert result["seq"] == list(range(trigger_seq - 3, trigger_seq + 11))
+    assert result["values"]["tripped"] == [False] * 3 + [True] * 11
+
+
+def test_retrigger_extends_capture(recorder):
+    """Test that a trigger during the post period is added to the capture and extends it."""
+    recorder.step(5)
+    recorder.step(5, tripped=1)
+    recorder.step(temp_latched=1)
+    assert recorder.step(9)
+    assert not recorder.step()
+
+    (summary,) = recorder.buffer.summaries()
+    assert summary["triggers"] == ["tripped", "temp_latched"]
+    assert summary["samples"] == 3 + 16
+
+
+def test_capture_ends_when_full(pscu):
+    """Test that a capture ends when it holds its maximum number of snapshots."""
+    recorder = Recorder(pscu, CaptureBuffer(pscu, TRIGGERS, 4, 3, 10.0, 2))
+    recorder.step(5)
+    assert recorder.step(3, tripped=1)
+    assert not recorder.step()
+    assert recorder.buffer.summaries()[0]["samples"] == 7
+
+
+def test_triggers_are_edge_sensitive(pscu):
+    """Test that a signal already active when recording starts does not trigger a capture."""
+    recorder = Recorder(pscu, CaptureBuffer(pscu, TRIGGERS, 4, 20, 1.0, 2))
+    assert not recorder.step(5, tripped=1)
+
+
+def test_oldest_captures_discarded(recorder):
+    """Test that only the most recent captures are retained and unknown ones are rejected."""
+    for _ in range(3):
+        recorder.step(tripped=0)
+        recorder.step(12, tripped=1)
+
+    assert [summary["number"] for summary in recorder.buffer.summaries()] == [2, 3]
+    with pytest.raises(ValueError):
+        recorder.buffer.query(1)
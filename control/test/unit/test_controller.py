@@ -0,0 +1,182 @@
+"""Tests of the PSCUSolo controller delta, field, encoded, long-poll and history queries."""
+import asyncio
+import json
+
+import pytest
+
+TRIP_OVER_PATH = "temperature/sensors/0/trip_over"
+
+
+def toggle_trip_over(controller):
+    """Toggle the temperature 1 over trip input and publish a snapshot including it."""
+    controller.pscu.mcp[2].port ^= 1
+    controller.do_update()
+
+
+def leaf(tree, path):
+    """Return the value at a path in a sparse tree."""
+    for key in path.split("/"):
+        tree = tree[key]
+    return tree
+
+
+def test_delta_from_zero_returns_all_signals(controller):
+    """Test that a delta query since zero returns every signal and the current sequence number."""
+    full = controller.get("", 0)
+    assert full["seq"] == controller.snapshot.seq
+    assert full["epoch"] == controller.epoch
+    assert leaf(full["values"], TRIP_OVER_PATH) == controller.pscu.value("temp1_trip_over")
+
+
+def test_delta_when_up_to_date_is_empty(controller):
+    """Test that a delta query since the current snapshot returns no values."""
+    seq = controller.get("", 0)["seq"]
+    controller.do_update()
+
+    delta = controller.get("", seq)
+    assert delta["seq"] > seq
+    assert delta["values"] == {}
+
+
+def test_delta_returns_changed_signals(controller):
+    """Test that a delta query returns only the signals changed after the given snapshot."""
+    seq = controller.get("", 0)["seq"]
+    toggle_trip_over(controller)
+
+    delta = controller.get("", seq)
+    value = controller.pscu.value("temp1_trip_over")
+    assert delta["values"] == {"temperature": {"sensors": {"0": {"trip_over": value}}}}
+    assert controller.get("", delta["seq"])["values"] == {}
+
+
+def test_delta_under_path_and_fields(controller):
+    """Test that a delta query is restricted to the signals under the path and fields."""
+    seq = controller.get("", 0)["seq"]
+    toggle_trip_over(controller)
+
+    assert controller.get("temperature", seq)["values"] != {}
+    assert controller.get("humidity", seq)["values"] == {}
+    assert controller.get("temperature", seq, fields=["healthy"])["values"] == {}
+
+
+def test_delta_after_restart_returns_all_signals(controller):
+    """Test that all signals are returned to a client whose since value predates a restart."""
+    full = controller.get("", 0)
+    seq = full["seq"]
+    controller.do_update()
+
+    assert controller.get("", seq, epoch=controller.epoch)["values"] == {}
+    assert controller.get("", seq, epoch="previous")["values"] == full["values"]
+    assert controller.get("", controller.snapshot.seq + 10)["values"] == full["values"]
+
+
+def test_encoded_tree_cached_per_snapshot(controller):
+    """Test that the JSON encoding of a cached path is reused until the next snapshot."""
+    encoded = controller.get_encoded("")
+    assert json.loads(encoded) == json.loads(json.dumps(controller.get("")))
+    assert controller.get_encoded("") is encoded
+    assert controller.get_encoded("/") is encoded
+
+    controller.do_update()
+    assert controller.get_encoded("") is not encoded
+
+
+def test_encoded_tree_invalidated_by_live_leaves(controller):
+    """Test that the cached encodings are regenerated when a leaf outside the snapshot changes."""
+    encoded = controller.get_encoded("fans")
+    controller.invalidate_encoded()
+
+    assert controller.get_encoded("fans") is not encoded
+    assert controller.get_encoded("fans") == encoded
+
+
+def run_wait(controller, *args, update=None, delay=0.05):
+    """Run a long-poll wait, running an update after a delay, and return the time waited."""
+    async def run():
+        loop = asyncio.get_running_loop()
+        if update is not None:
+            loop.call_later(delay, update)
+        start = loop.time()
+        await controller.wait(*args)
+        return loop.time() - start
+
+    return asyncio.run(run())
+
+
+def test_wait_for_next_snapshot(controller):
+    """Test that a long-poll without since returns when the next snapshot is published."""
+    seq = controller.snapshot.seq
+
+    assert run_wait(controller, "", 5.0, update=controller.do_update) < 1.0
+    assert controller.snapshot.seq == seq + 1
+
+
+def test_wait_since_returns_when_already_changed(controller):
+    """Test that a long-poll since a snapshot returns at once if a signal has changed since."""
+    seq = controller.snapshot.seq
+    toggle_trip_over(controller)
+
+    assert run_wait(controller, "", 5.0, seq) < 0.05
+
+
+def test_wait_since_for_change_under_path(controller):
+    """Test that a long-poll since a snapshot only returns for a change under its path."""
+    seq = controller.snapshot.seq
+    waited = run_wait(controller, "humidity", 0.2, seq, update=lambda: toggle_trip_over(controller))
+    assert waited >= 0.15
+
+    seq = controller.snapshot.seq
+    assert run_wait(
+        controller, "temperature", 5.0, seq, update=lambda: toggle_trip_over(controller)
+    ) < 1.0
+
+
+def test_wait_times_out_without_change(controller):
+    """Test that a long-poll since the current snapshot times out if no signal changes."""
+    seq = controller.snapshot.seq
+
+    assert run_wait(controller, "", 0.2, seq, update=controller.do_update) >= 0.15
+    assert controller.get("", seq)["values"] == {}
+
+
+def test_fields_select_leaves(controller):
+    """Test that fields select the leaves under each relative path as one sparse tree."""
+    result = controller.get("temperature", fields=["healthy", "sensors/1/temperature", ""])
+
+    assert result == {"temperature": {
+        "healthy": controller.pscu.value("temp_healthy"),
+        "sensors": {"1": {"temperature": controller.pscu.value("temp2")}},
+    }}
+
+
+def test_fields_at_root(controller):
+    """Test that fields of the root path select whole subtrees."""
+    result = controller.get("", fields=["humidity", "snapshot/seq"])
+
+    assert set(result) == {"humidity", "snapshot"}
+    assert result["snapshot"] == {"seq": controller.snapshot.seq}
+    assert result["humidity"]["sensors"]["0"]["sensor_name"] == "Internal"
+
+
+def test_fields_invalid_path(controller):
+    """Test that a field that is not in the tree is rejected."""
+    from odin.adapters.parameter_tree import ParameterTreeError
+
+    with pytest.raises(ParameterTreeError):
+        controller.get("temperature", fields=["bogus"])
+
+
+def test_history_paged_by_signal_count(controller, monkeypatch):
+    """Test that history queries are limited to a page of values, shorter with more signals."""
+    monkeypatch.setattr(controller, "MAX_QUERY_VALUES", 6)
+    for _ in range(5):
+        controller.do_update()
+
+    page = controller.get_history(names=["temp1", "temp2"])
+    assert len(page["seq"]) == 3
+    assert page["truncated"] is True
+
+    seq = page["seq"][-1]
+    page = controller.get_history(start=page["timestamp"][-1], names=["temp1", "temp2"])
+    assert page["seq"][0] == seq
+    assert len(controller.get_history()["seq"]) == 1
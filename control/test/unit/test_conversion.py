@@ -0,0 +1,81 @@
+"""Tests of the PSCUSolo ADC conversions."""
+import pytest
+
+from pscusolo import conversion
+from pscusolo.conversion import ADC_CODES, get_lut, lookup
+
+
+CONVERSIONS = [
+    conversion.temp1_adc, conversion.temp1_raw_adc, conversion.temp2_adc,
+    conversion.temp2_raw_adc, conversion.humid_adc, conversion.humid_raw_adc, conversion.leak_adc,
+]
+
+
+@pytest.mark.parametrize("function", CONVERSIONS)
+def test_lut_matches_conversion(function):
+    """Test that the lookup table holds the converted value of every code where it is defined."""
+    lut = get_lut(function)
+    assert len(lut) == ADC_CODES
+
+    for code in range(1, ADC_CODES - 1):
+        assert lut[code] == pytest.approx(function(code))
+
+
+def test_lut_saturates_where_undefined():
+    """Test that codes where the conversion is undefined take the value of the nearest code."""
+    lut = get_lut(conversion.temp2_adc)
+
+    assert lut[0] == lut[1]
+    assert lut[ADC_CODES - 1] == lut[ADC_CODES - 2]
+
+
+def test_lut_is_cached():
+    """Test that the lookup table of a conversion is built once."""
+    assert get_lut(conversion.humid_adc) is get_lut(conversion.humid_adc)
+
+
+def test_lookup_clamps():
+    """Test that out-of-range codes are clamped to the ends of the table."""
+    lut = get_lut(conversion.humid_adc)
+
+    assert lookup(lut, -5) == lut[0]
+    assert lookup(lut, ADC_CODES + 5) == lut[ADC_CODES - 1]
+    assert lookup(lut, 2048.0) == lut[2048]
+
+
+def test_acquisition_uses_lut(pscu):
+    """Test that the live values are those given by the lookup tables."""
+    pscu.adc[0].codes[2] = 1234
+    pscu.adc[0].codes[6] = 2345
+    pscu.update()
+
+    assert pscu.value("temp1") == get_lut(conversion.temp1_adc)[1234]
+    assert pscu.value("temp2") == get_lut(conversion.temp2_adc)[2345]
+
+
+@pytest.mark.parametrize("function", CONVERSIONS)
+def test_convert_array_matches_lut(function):
+    """Test that the vectorised conversions match the lookup tables, keeping the array shape."""
+    np = pytest.importorskip("numpy")
+    codes = np.arange(ADC_CODES, dtype=np.uint16).reshape(64, 64)
+
+    values = getattr(conversion, function.__name__ + "_array")(codes)
+
+    assert values.shape == codes.shape
+    assert values.ravel().tolist() == get_lut(function).tolist()
+
+
+def test_convert_array_clamps():
+    """Test that the vectorised conversions clamp out-of-range codes to the table ends."""
+    pytest.importorskip("numpy")
+    lut = get_lut(conversion.leak_adc)
+
+    assert conversion.leak_adc_array([-1, 5000]).tolist() == [lut[0], lut[ADC_CODES - 1]]
+
+
+def test_convert_array_without_numpy(monkeypatch):
+    """Test that the vectorised conversions report that numpy is required when it is missing."""
+    monkeypatch.setattr(conversion, "np", None)
+
+    with pytest.raises(ImportError):
+        conversion.humid_adc_array([0, 1])
@@ -0,0 +1,47 @@
+"""Tests of the PSCUSolo binary snapshot encoding."""
+import struct
+
+import pytest
+
+from pscusolo.encoding import SnapshotEncoder
+
+
+def decode(data):
+    """Decode an encoded snapshot into its sequence number, timestamp and value lists."""
+    (num_analog, num_status, seq, timestamp) = struct.unpack_from("<HHQd", data)
+    offset = struct.calcsize("<HHQd")
+    analog = list(struct.unpack_from("<{}f".format(num_analog), data, offset))
+    offset += 4 * num_analog
+    bits = int.from_bytes(data[offset:], "little")
+    assert len(data) - offset == (num_status + 7) // 8
+
+    return (seq, timestamp, analog, [bool(bits & (1 << bit)) for bit in range(num_status)])
+
+
+def test_layout(pscu):
+    """Test that the layout lists the analog and status signals in signal table order."""
+    layout = SnapshotEncoder(pscu).layout()
+
+    names = [signal.name for signal in pscu.SIGNALS]
+    assert sorted(layout["analog"] + layout["status"]) == sorted(names)
+    for (is_status, key) in ((False, "analog"), (True, "status")):
+        assert layout[key] == [
+            name for (name, (status, _, _)) in zip(names, pscu.layout) if status == is_status
+        ]
+
+
+def test_encode(pscu):
+    """Test that an encoded snapshot decodes to the values of the state record."""
+    pscu.adc[0].codes = [500 * channel for channel in range(8)]
+    pscu.mcp[0].port = 0xa5
+    pscu.update()
+    state = pscu.snapshot()
+    encoder = SnapshotEncoder(pscu)
+
+    (seq, timestamp, analog, status) = decode(encoder.encode(state))
+
+    assert (seq, timestamp) == (state.seq, state.timestamp)
+    assert analog == pytest.approx(list(state.analog), rel=1e-6)
+    assert status == [bool(value) for value in state.status]
+    for (name, value) in zip(encoder.layout()["status"], status):
+        assert value == pscu.value(name)
@@ -0,0 +1,63 @@
+"""Tests of the PSCUSolo status transition event log."""
+import pytest
+
+from pscusolo.events import EventLog
+
+
+def publish(log, pscu, timestamp, port=None):
+    """Update the PSCUSolo with an optional GPIO expander 0 port value and log the transitions."""
+    previous = pscu.snapshot()
+    if port is not None:
+        pscu.mcp[0].port = port
+    pscu.update()
+    state = pscu.snapshot()
+    state.timestamp = timestamp
+    log.record(previous, state)
+
+
+def test_transitions_logged(pscu):
+    """Test that each changed status signal is logged with its new value, and nothing else."""
+    log = EventLog(pscu, 16)
+    publish(log, pscu, 1.0, port=0)
+    publish(log, pscu, 2.0)
+    assert log.total == 0
+
+    publish(log, pscu, 3.0, port=1 << 7)
+    publish(log, pscu, 4.0, port=0)
+
+    result = log.query(names=["tripped"])
+    assert result["timestamp"] == [3.0, 4.0]
+    assert result["signal"] == ["tripped", "tripped"]
+    assert result["value"] == [False, True]
+    assert result["seq"] == sorted(result["seq"])
+    assert log.total == log.count
+
+
+def test_query_range(pscu):
+    """Test that a query returns the events in the time range."""
+    log = EventLog(pscu, 16)
+    publish(log, pscu, 1.0, port=0)
+    for idx in range(6):
+        publish(log, pscu, float(idx + 2), port=(1 << 7) * (idx % 2 == 0))
+
+    assert log.query(3.0, 5.0, ["tripped"])["timestamp"] == [3.0, 4.0, 5.0]
+    assert log.query(10.0)["timestamp"] == []
+
+
+def test_query_unknown_signal(pscu):
+    """Test that only status signals can be queried."""
+    log = EventLog(pscu, 16)
+
+    with pytest.raises(ValueError):
+        log.query(names=["temp1"])
+
+
+def test_oldest_events_overwritten(pscu):
+    """Test that a full log overwrites its oldest events, still counting every event."""
+    log = EventLog(pscu, 4)
+    publish(log, pscu, 1.0, port=0)
+    for idx in range(6):
+        publish(log, pscu, float(idx + 2), port=(1 << 7) * (idx % 2 == 0))
+
+    assert (log.count, log.total) == (4, 6)
+    assert log.query()["timestamp"] == [4.0, 5.0, 6.0, 7.0]
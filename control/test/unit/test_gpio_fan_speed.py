@@ -0,0 +1,134 @@
+"""Tests of the PSCUSolo fan speed measurement and rolling statistics."""
+import random
+import statistics
+from types import SimpleNamespace
+
+import pytest
+
+from pscusolo import gpio_fan_speed
+from pscusolo.gpio_fan_speed import GpioFanSpeed, RollingMean, RollingStats
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the clocks used by the fan speed module with a clock advanced by the test."""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(
+        gpio_fan_speed, "time",
+        SimpleNamespace(perf_counter=lambda: clock.now, monotonic=lambda: clock.now)
+    )
+    return clock
+
+
+@pytest.mark.parametrize("window", [1, 2, 5, 17])
+def test_rolling_stats_match_window(window):
+    """Test that the rolling statistics match those computed over the window directly."""
+    rng = random.Random(window)
+    stats = RollingStats(window)
+    values = []
+
+    for idx in range(500):
+        value = rng.gauss(1000.0, 50.0) if idx % 3 else float(rng.randint(0, 5))
+        stats.append(value)
+        values.append(value)
+        recent = values[-window:]
+
+        assert len(stats) == len(recent)
+        assert list(stats) == recent
+        assert stats.mean == pytest.approx(statistics.fmean(recent))
+        assert stats.min == min(recent)
+        assert stats.max == max(recent)
+        if len(recent) > 1:
+            assert stats.variance == pytest.approx(statistics.variance(recent), rel=1e-6, abs=1e-6)
+
+
+def test_rolling_stats_empty():
+    """Test that the statistics are zero before any value is appended and after clearing."""
+    stats = RollingStats(4)
+    assert (stats.mean, stats.variance, stats.min, stats.max) == (0, 0, 0, 0)
+
+    stats.append(3.0)
+    stats.clear()
+    assert len(stats) == 0
+    assert stats.mean == 0
+
+
+def test_rolling_stats_large_offset():
+    """Test that the variance of values with a large offset does not lose precision."""
+    stats = RollingStats(10)
+    for idx in range(1000):
+        stats.append(1e9 + idx % 4)
+
+    expected = statistics.variance([idx % 4 for idx in range(990, 1000)])
+    assert stats.variance == pytest.approx(expected)
+
+
+def test_rolling_mean_compatibility():
+    """Test that the rolling mean alias keeps its maxlen interface."""
+    mean = RollingMean(maxlen=3)
+    for value in (1.0, 2.0, 3.0, 4.0):
+        mean.append(value)
+
+    assert mean.maxlen == 3
+    assert mean.mean == pytest.approx(3.0)
+
+
+def run_fan(fan, clock, period, count):
+    """Simulate tacho edges at a fixed period, updating the fan speed every fifth edge."""
+    for idx in range(count):
+        fan._callback(fan.tach_pin)
+        clock.now += period
+        if idx % 5 == 4:
+            fan.update()
+
+
+def test_fan_speed_period_mode(clock):
+    """Test that the speed is measured from the edge intervals in period measurement mode."""
+    fan = GpioFanSpeed("P8_18", period_mode=True)
+    run_fan(fan, clock, 0.01, 20)
+
+    assert fan.rpm == pytest.approx(3000, abs=1)
+
+
+def test_fan_stall_detection(clock):
+    """Test that a fan is stalled once no edge is seen within the stall limit."""
+    fan = GpioFanSpeed(
+        "P8_18", period_mode=True, short_window=2, long_window=3, stall_min_time=0.5
+    )
+    assert not fan.stalled
+    clock.now += 1.01
+    assert fan.stalled
+
+    run_fan(fan, clock, 0.01, 30)
+    assert fan.baseline_rpm == pytest.approx(3000, abs=1)
+    assert not fan.stalled
+
+    # The stall factor multiple of the expected period at the baseline speed is shorter than the
+    # minimum stall time, which therefore applies
+    clock.now += 0.4
+    assert not fan.stalled
+    clock.now += 0.2
+    assert fan.stalled
+
+
+def test_fan_stall_factor(clock):
+    """Test that the stall limit follows the baseline speed when longer than the minimum."""
+    fan = GpioFanSpeed("P8_18", period_mode=True, baseline_rpm=60, stall_min_time=0.5)
+    fan._callback(fan.tach_pin)
+
+    # Three pulse periods at 2 Hz
+    clock.now += 1.4
+    assert not fan.stalled
+    clock.now += 0.2
+    assert fan.stalled
+
+
+def test_fan_degraded(clock):
+    """Test that a fan is degraded once its speed stays below the fraction of the baseline."""
+    fan = GpioFanSpeed("P8_18", period_mode=True, short_window=2, long_window=3)
+    run_fan(fan, clock, 0.01, 30)
+    assert not fan.degraded
+
+    run_fan(fan, clock, 0.02, 30)
+    assert fan.baseline_rpm == pytest.approx(3000, abs=1)
+    assert fan.degraded
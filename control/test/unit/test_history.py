@@ -0,0 +1,109 @@
+"""Tests of the PSCUSolo in-memory snapshot history."""
+import pytest
+
+from pscusolo import conversion
+from pscusolo.history import History
+
+
+def record(history, pscu, count, codes=None):
+    """Record a number of updates in a history, at timestamps 1, 2, ... and optional codes."""
+    for idx in range(count):
+        if codes is not None:
+            pscu.adc[0].codes[2] = codes[idx]
+        pscu.update()
+        state = pscu.snapshot()
+        state.timestamp = float(idx + 1)
+        history.record(state)
+
+
+def test_query_values(pscu):
+    """Test that the recorded values of all signals are those of the snapshots."""
+    history = History(pscu, 8)
+    record(history, pscu, 3, codes=[1000, 2000, 3000])
+
+    result = history.query()
+
+    assert result["timestamp"] == [1.0, 2.0, 3.0]
+    assert result["seq"] == sorted(result["seq"])
+    assert result["truncated"] is False
+    assert set(result["values"]) == {signal.name for signal in pscu.SIGNALS}
+    for signal in pscu.SIGNALS:
+        assert result["values"][signal.name][-1] == pscu.value(signal.name)
+    assert result["values"]["temp1"][0] == conversion.get_lut(conversion.temp1_adc)[1000]
+
+
+def test_query_range_and_names(pscu):
+    """Test that a query returns the selected signals of the snapshots in the time range."""
+    history = History(pscu, 8)
+    record(history, pscu, 6)
+
+    result = history.query(2.0, 4.0, ["temp1", "overall"])
+
+    assert result["timestamp"] == [2.0, 3.0, 4.0]
+    assert list(result["values"]) == ["temp1", "overall"]
+    assert history.query(10.0)["timestamp"] == []
+
+    with pytest.raises(ValueError):
+        history.query(names=["bogus"])
+
+
+def test_ring_wraps(pscu):
+    """Test that a full history overwrites its oldest snapshots."""
+    history = History(pscu, 4)
+    record(history, pscu, 7, codes=list(range(100, 800, 100)))
+
+    result = history.query(names=["temp1_raw"])
+
+    assert history.count == 4
+    assert (history.oldest(), history.newest()) == (4.0, 7.0)
+    assert result["timestamp"] == [4.0, 5.0, 6.0, 7.0]
+    assert result["values"]["temp1_raw"] == [code / 4095. for code in (400, 500, 600, 700)]
+
+
+def test_query_limit(pscu):
+    """Test that a query is truncated to the limit, and the next page follows from its end."""
+    history = History(pscu, 8)
+    record(history, pscu, 5)
+
+    page = history.query(names=["temp1"], limit=2)
+    assert page["timestamp"] == [1.0, 2.0]
+    assert page["truncated"] is True
+
+    page = history.query(start=page["timestamp"][-1], names=["temp1"], limit=4)
+    assert page["timestamp"] == [2.0, 3.0, 4.0, 5.0]
+    assert page["truncated"] is False
+
+
+def test_codes_converted_at_query_time(pscu, monkeypatch):
+    """Test that ADC signals are recorded as codes and converted by the current lookup tables."""
+    history = History(pscu, 8)
+    record(history, pscu, 1, codes=[1234])
+    lut = [float(code) for code in range(4096)]
+    monkeypatch.setitem(history.columns, "temp1", ("code", 2, lut))
+
+    assert history.query(names=["temp1"])["values"]["temp1"] == [1234.0]
+
+
+def test_query_raw_codes(pscu):
+    """Test that a raw query returns the ADC codes of every ADC signal, including the leak."""
+    history = History(pscu, 8)
+    pscu.adc[0].codes[0] = 1500
+    pscu.adc[1].codes[7] = 2500
+    record(history, pscu, 2, codes=[1111, 2222])
+
+    result = history.query(names=["temp1", "leak", "leak_sp", "overall"], raw=True)
+
+    assert result["values"]["temp1"] == [1111, 2222]
+    assert result["values"]["leak"] == [1500, 1500]
+    assert result["values"]["leak_sp"] == [2500, 2500]
+    assert result["values"]["overall"] == [pscu.value("overall")] * 2
+
+
+def test_copy_from(pscu):
+    """Test that copying a history records its snapshots, oldest first."""
+    history = History(pscu, 3)
+    record(history, pscu, 5, codes=[100, 200, 300, 400, 500])
+    copy = History(pscu, 8)
+    copy.copy_from(history)
+
+    assert copy.query() == history.query()
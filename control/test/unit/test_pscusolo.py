@@ -0,0 +1,163 @@
+"""Tests of the PSCUSolo signal acquisition."""
+from pscusolo.pscusolo import PSCUSolo, SCAN_FAST, SCAN_NORMAL, SCAN_SLOW
+
+
+def test_gpio_port_read_once_per_expander(pscu):
+    """Test that each GPIO expander is read with a single transaction per update."""
+    for mcp in pscu.mcp:
+        mcp.accesses = 0
+    pscu.update()
+
+    assert [mcp.accesses for mcp in pscu.mcp] == [1, 1, 1]
+
+
+def test_gpio_pins_read_individually():
+    """Test that each input pin is read separately when bulk reads are disabled."""
+    pscu = PSCUSolo(bulk_read=False)
+    for mcp in pscu.mcp:
+        mcp.accesses = 0
+    pscu.update()
+
+    assert [mcp.accesses for mcp in pscu.mcp] == [
+        bin(mask).count("1") for mask in pscu.gpio_masks
+    ]
+
+
+def test_gpio_port_decode(pscu):
+    """Test that the status signals are decoded from the port values, inverted as declared."""
+    pscu.mcp[0].port = 1 << 7
+    pscu.mcp[1].port = 1 << 5
+    pscu.update()
+    assert not pscu.value("tripped")
+    assert pscu.value("armed")
+
+    pscu.mcp[0].port = 0
+    pscu.mcp[1].port = 0
+    pscu.update()
+    assert pscu.value("tripped")
+    assert not pscu.value("armed")
+
+
+def test_gpio_port_read_failure_keeps_previous_value(pscu):
+    """Test that a failed port read is counted and does not change the status signals."""
+    pscu.update()
+    status = bytes(pscu.snapshot().status)
+    assert pscu.value("tripped")
+
+    pscu.mcp[0].fail = True
+    pscu.update()
+
+    assert pscu.gpio_errors == [1, 0, 0]
+    assert bytes(pscu.snapshot().status) == status
+
+
+def test_adc_sequence_read_once_per_chip(pscu):
+    """Test that each ADC is converted with one sequence write and one block read per update."""
+    for adc in pscu.adc:
+        adc.accesses = 0
+    pscu.update()
+
+    assert [adc.accesses for adc in pscu.adc] == [2, 2]
+
+
+def test_adc_sequence_decode(pscu):
+    """Test that the codes read back in a sequence are stored by their channel numbers."""
+    pscu.adc[0].codes = [100 * (channel + 1) for channel in range(8)]
+    pscu.adc[1].codes = [1000 + channel for channel in range(8)]
+    pscu.update()
+
+    for (adc_idx, mask) in enumerate(pscu.adc_masks):
+        for channel in range(8):
+            if mask & (1 << channel):
+                expected = pscu.adc[adc_idx].codes[channel]
+                assert pscu.adc_values[8 * adc_idx + channel] == expected
+
+
+def test_adc_sequence_read_failure_keeps_previous_codes(pscu):
+    """Test that a failed sequence read is counted and leaves the codes of the chip unchanged."""
+    pscu.adc[0].codes[2] = 2000
+    pscu.update()
+    temp1 = pscu.value("temp1")
+
+    pscu.adc[0].codes[2] = 1000
+    pscu.adc[0].fail = True
+    pscu.update()
+
+    assert pscu.adc_errors == [1, 0]
+    assert pscu.adc_values[2] == 2000
+    assert pscu.value("temp1") == temp1
+
+
+def test_adc_sequence_short_read(pscu, monkeypatch):
+    """Test that a short sequence readback is treated as a failed read."""
+    pscu.adc[0].codes[2] = 2000
+    pscu.update()
+
+    pscu.adc[0].codes[2] = 1000
+    monkeypatch.setattr(pscu.adc[0], "readList", lambda reg, length: [0] * (length - 2))
+    pscu.update()
+
+    assert pscu.adc_errors == [1, 0]
+    assert pscu.adc_values[2] == 2000
+
+
+def test_fast_scan_skips_adcs(pscu):
+    """Test that a scan of the fast class only reads the GPIO expanders."""
+    for device in pscu.adc + pscu.mcp:
+        device.accesses = 0
+    pscu.update([SCAN_FAST])
+
+    assert [adc.accesses for adc in pscu.adc] == [0, 0]
+    assert all(mcp.accesses for mcp in pscu.mcp)
+
+
+def test_setpoints_only_update_in_slow_scan(pscu):
+    """Test that setpoints keep their value until the slow class is scanned."""
+    before = (pscu.value("temp1"), pscu.value("temp1_sp_over"))
+    pscu.adc[0].codes[2] = 3000
+    pscu.adc[1].codes[3] = 3000
+
+    pscu.update([SCAN_FAST, SCAN_NORMAL])
+    assert pscu.value("temp1") != before[0]
+    assert pscu.value("temp1_sp_over") == before[1]
+
+    pscu.update([SCAN_SLOW])
+    assert pscu.value("temp1_sp_over") != before[1]
+
+
+def test_scan_plans_are_cached(pscu):
+    """Test that the plan of each combination of scan classes is built once."""
+    plan = pscu.scan_plan(frozenset([SCAN_FAST]))
+
+    assert pscu.scan_plan(frozenset([SCAN_FAST])) is plan
+    assert pscu.scan_plan(frozenset([SCAN_FAST, SCAN_SLOW])) is not plan
+
+
+def test_signal_layout(pscu):
+    """Test that every signal has its own offset in the analog or status values of a record."""
+    names = [signal.name for signal in pscu.SIGNALS]
+    assert len(set(names)) == len(names)
+
+    paths = [signal.path for signal in pscu.SIGNALS if signal.path]
+    assert len(set(paths)) == len(paths)
+
+    state = pscu.snapshot()
+    for is_status in (False, True):
+        offsets = sorted(offset for (status, offset, _) in pscu.layout if status == is_status)
+        size = len(state.status) if is_status else len(state.analog)
+        assert offsets == list(range(size))
+
+
+def test_logic_signals(pscu):
+    """Test that the overall and latched states are derived from their input signals."""
+    pscu.mcp[0].port = 0x0f
+    pscu.mcp[1].port = 0x0f
+    pscu.update()
+    assert pscu.value("overall")
+    assert not pscu.value("latched")
+
+    pscu.mcp[0].port = 0x0e
+    pscu.mcp[1].port = 0x0e
+    pscu.update()
+    assert not pscu.value("overall")
+    assert pscu.value("latched")
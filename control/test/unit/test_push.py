@@ -0,0 +1,77 @@
+"""Tests of the PSCUSolo WebSocket push channel."""
+import asyncio
+import json
+import socket
+
+import pytest
+
+pytest.importorskip("odin.adapters.parameter_tree")
+
+from tornado.websocket import websocket_connect  # noqa: E402
+
+from pscusolo.controller import PSCUSoloController  # noqa: E402
+
+
+def unused_port():
+    """Return a TCP port that is free to listen on."""
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def run_with_push(test):
+    """Run a coroutine test function with a controller serving a push channel and a client."""
+    async def run():
+        port = unused_port()
+        controller = PSCUSoloController(push_port=port, fan_stall_min_time=3600.0)
+        controller.update_task.stop()
+        client = await websocket_connect("ws://localhost:{}/".format(port))
+        try:
+            await test(controller, client)
+        finally:
+            client.close()
+            controller.cleanup()
+
+    asyncio.run(run())
+
+
+async def receive(client, timeout=1.0):
+    """Receive and decode a message from the push channel, or return None on timeout."""
+    try:
+        message = await asyncio.wait_for(client.read_message(), timeout)
+    except asyncio.TimeoutError:
+        return None
+    return json.loads(message)
+
+
+def test_push_sends_full_tree_on_connect():
+    """Test that a client is sent all signals when it connects."""
+    async def test(controller, client):
+        message = await receive(client)
+        assert message["seq"] == controller.snapshot.seq
+        assert message["values"] == controller.get("", 0)["values"]
+        assert len(controller.push.clients) == 1
+        assert json.loads(controller.get_encoded(""))["push"]["clients"] == 1
+
+    run_with_push(test)
+
+
+def test_push_sends_changes():
+    """Test that a client is sent the signals changed by each update, and nothing otherwise."""
+    async def test(controller, client):
+        await receive(client)
+
+        controller.pscu.mcp[2].port ^= 1
+        controller.do_update()
+        message = await receive(client)
+        assert message["seq"] == controller.snapshot.seq
+        assert message["values"] == {
+            "temperature": {"sensors": {"0": {"trip_over": controller.pscu.value(
+                "temp1_trip_over"
+            )}}}
+        }
+
+        controller.do_update()
+        assert await receive(client, 0.2) is None
+
+    run_with_push(test)
@@ -0,0 +1,78 @@
+"""Tests of the PSCUSolo mux-aware I2C scan planner."""
+from pscusolo.scan import ScanPlanner, ScanTransaction
+
+
+class Mux:
+    """TCA9548 stand-in recording the channel selections written to it."""
+
+    def __init__(self):
+        """Initialise the mux with no selections."""
+        self.writes = []
+        self.fail = False
+
+    def write8(self, reg, value):
+        """Record a channel selection, returning -1 if failing."""
+        self.writes.append(value)
+        return -1 if self.fail else None
+
+
+def test_select_only_writes_on_change():
+    """Test that the mux is only written when the selected channel changes."""
+    mux = Mux()
+    planner = ScanPlanner(mux)
+    for channel in (4, 4, 5, 5, 4):
+        planner.select(channel)
+
+    assert mux.writes == [1 << 4, 1 << 5, 1 << 4]
+    assert planner.selected_channel == 4
+
+
+def test_select_failure_reselects():
+    """Test that a failed select is not cached, so the next access selects again."""
+    mux = Mux()
+    planner = ScanPlanner(mux)
+    mux.fail = True
+    planner.select(4)
+    assert planner.selected_channel is None
+
+    mux.fail = False
+    planner.select(4)
+    planner.select(4)
+    assert mux.writes == [1 << 4, 1 << 4]
+    assert planner.selected_channel == 4
+
+
+def test_plan_groups_by_channel():
+    """Test that transactions are grouped by channel, starting with the selected one."""
+    planner = ScanPlanner(Mux())
+    planner.select(5)
+    transactions = [
+        ScanTransaction(channel, name, lambda: None)
+        for (channel, name) in ((4, "a"), (5, "b"), (4, "c"), (6, "d"), (5, "e"))
+    ]
+
+    assert [transaction.name for transaction in planner.plan(transactions)] == [
+        "b", "e", "a", "c", "d"
+    ]
+
+
+def test_run_counts_switches():
+    """Test that a run counts the mux switches performed and saved."""
+    mux = Mux()
+    planner = ScanPlanner(mux)
+    transactions = [
+        ScanTransaction(channel, str(idx), lambda channel=channel: planner.select(channel))
+        for (idx, channel) in enumerate((4, 5, 4, 5, 4))
+    ]
+    planner.run(transactions)
+
+    assert planner.mux_switches == 2
+    assert planner.mux_switches_saved == 3
+
+
+def test_update_switches_each_channel_once(pscu):
+    """Test that an update of all scan classes selects each device channel at most once."""
+    pscu.update()
+
+    assert pscu.planner.mux_switches <= 2
+    assert pscu.planner.mux_switches_saved > 0
@@ -0,0 +1,146 @@
+"""Tests of the PSCUSolo persistent history store."""
+import pytest
+
+from pscusolo.store import HistoryStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    """Return the path of a history file."""
+    return str(tmp_path / "history.bin")
+
+
+def record(store, pscu, count):
+    """Update the PSCUSolo and record its state in the store a number of times.
+
+    The batch is written to the file and synced whenever it is due, as by the controller.
+    """
+    for _ in range(count):
+        pscu.adc[0].codes[2] += 100
+        pscu.update()
+        state = pscu.snapshot()
+        if store.record_state(state):
+            store.flush(state.timestamp)
+
+
+def crash(store):
+    """Close the history file without writing the batch or updating the header."""
+    store.mmap.close()
+    store.file.close()
+
+
+def test_reopen_keeps_records(pscu, path):
+    """Test that flushed records are read back after reopening the file."""
+    store = HistoryStore(path, pscu, 10)
+    record(store, pscu, 4)
+    expected = store.query(names=["temp1"])
+    store.close()
+
+    store = HistoryStore(path, pscu, 10)
+    assert store.count == 4
+    assert store.query(names=["temp1"]) == expected
+    store.close()
+
+
+def test_recover_records_written_after_header(pscu, path):
+    """Test that records written to the file but not yet covered by the header are recovered."""
+    store = HistoryStore(path, pscu, 10)
+    record(store, pscu, 3)
+    store.flush()
+    record(store, pscu, 3)
+    store.write_batch()
+    expected = store.query(names=["temp1"])
+    crash(store)
+
+    store = HistoryStore(path, pscu, 10)
+    assert store.flushed_count == 6
+    assert store.query(names=["temp1"]) == expected
+    store.close()
+
+
+def test_recover_stops_at_torn_record(pscu, path):
+    """Test that recovery stops at a record whose CRC is invalid, keeping those before it."""
+    store = HistoryStore(path, pscu, 10)
+    record(store, pscu, 3)
+    store.flush()
+    record(store, pscu, 3)
+    store.write_batch()
+    expected = store.query(names=["temp1"])
+    store.mmap[store.offset(4) + store.timestamp_offset] ^= 0xff
+    crash(store)
+
+    store = HistoryStore(path, pscu, 10)
+    assert store.flushed_count == 4
+    assert store.query(names=["temp1"])["seq"] == expected["seq"][:4]
+    store.close()
+
+
+def test_recover_after_wrapping(pscu, path):
+    """Test that recovery stops at the records of the previous pass of the ring buffer."""
+    store = HistoryStore(path, pscu, 4)
+    record(store, pscu, 6)
+    store.flush()
+    record(store, pscu, 1)
+    store.write_batch()
+    crash(store)
+
+    store = HistoryStore(path, pscu, 4)
+    assert store.flushed_count == 7
+    assert store.count == 4
+    store.close()
+
+
+def test_torn_header_falls_back_to_other_copy(pscu, path):
+    """Test that a header copy with an invalid CRC is ignored in favour of the other copy."""
+    store = HistoryStore(path, pscu, 10)
+    record(store, pscu, 3)
+    store.flush()
+    record(store, pscu, 2)
+    store.flush()
+    expected = store.query(names=["temp1"])
+    store.mmap[(store.header_seq % 2) * store.HEADER_COPY_SIZE + 40] ^= 0xff
+    crash(store)
+
+    store = HistoryStore(path, pscu, 10)
+    assert store.flushed_count == 5
+    assert store.query(names=["temp1"]) == expected
+    store.close()
+
+
+def test_invalid_headers_scan_records(pscu, path):
+    """Test that the records are scanned for the newest if neither header copy is valid."""
+    store = HistoryStore(path, pscu, 4)
+    record(store, pscu, 6)
+    store.flush()
+    expected = store.query(names=["temp1"])
+    for copy in range(2):
+        store.mmap[copy * store.HEADER_COPY_SIZE + 40] ^= 0xff
+    crash(store)
+
+    store = HistoryStore(path, pscu, 4)
+    assert store.flushed_count == 6
+    assert store.query(names=["temp1"]) == expected
+    store.close()
+
+
+def test_recreate_for_different_capacity(pscu, path):
+    """Test that a file created with a different capacity is recreated empty."""
+    store = HistoryStore(path, pscu, 10)
+    record(store, pscu, 3)
+    store.close()
+
+    store = HistoryStore(path, pscu, 12)
+    assert store.count == 0
+    store.close()
+
+
+def test_query_limit(pscu, path):
+    """Test that a query is truncated to the limit from the start of the range."""
+    store = HistoryStore(path, pscu, 10)
+    record(store, pscu, 5)
+    result = store.query(names=["temp1"])
+    limited = store.query(names=["temp1"], limit=2)
+    assert limited["seq"] == result["seq"][:2]
+    assert limited["truncated"]
+    assert not result["truncated"]
+    store.close()
@@ -0,0 +1,100 @@
+"""Tests of the PSCUSolo downsampled trend history and ring buffer indexing."""
+import random
+
+import pytest
+
+from pscusolo.history import TrendHistory
+from pscusolo.ring import RingBuffer, bisect_times
+
+TIERS = ((1, 10), (4, 5), (16, 100))
+
+
+def record(trend, pscu, count, start=1000.0, interval=0.25):
+    """Record random temp1 values in a trend history, returning the (timestamp, value) samples."""
+    rng = random.Random(1)
+    state = pscu.next_state()
+    offset = pscu.layout[pscu.signal_index["temp1"]][1]
+    samples = []
+    for idx in range(count):
+        state.timestamp = start + idx * interval
+        state.analog[offset] = rng.random()
+        samples.append((state.timestamp, state.analog[offset]))
+        trend.record(state)
+
+    return samples
+
+
+def brute_force(samples, period):
+    """Return the values of samples grouped into buckets of a period, keyed by start time."""
+    buckets = {}
+    for (timestamp, value) in samples:
+        buckets.setdefault(timestamp - timestamp % period, []).append(value)
+    return buckets
+
+
+@pytest.mark.parametrize("resolution", [1, 4, 16, None])
+def test_buckets_match_samples(pscu, resolution):
+    """Test that every bucket of each tier, including the open ones, aggregates its samples."""
+    trend = TrendHistory(pscu, ["temp1", "leak"], TIERS)
+    samples = record(trend, pscu, 203)
+
+    result = trend.query(resolution=resolution, names=["temp1"])
+    expected = brute_force(samples, result["period"])
+    values = result["values"]["temp1"]
+
+    assert result["period"] == (resolution or 16)
+    assert result["start"][-1] == max(expected)
+    for (idx, start) in enumerate(result["start"]):
+        bucket = expected[start]
+        assert result["count"][idx] == len(bucket)
+        assert values["min"][idx] == min(bucket)
+        assert values["max"][idx] == max(bucket)
+        assert values["mean"][idx] == pytest.approx(sum(bucket) / len(bucket))
+
+
+def test_bare_query_after_startup(pscu):
+    """Test that a query of the coarsest tier includes samples not yet closed into it."""
+    trend = TrendHistory(pscu, ["temp1"], TIERS)
+    samples = record(trend, pscu, 3)
+
+    result = trend.query()
+
+    assert result["period"] == 16
+    assert result["count"] == [3]
+    assert result["values"]["temp1"]["max"] == [max(value for (_, value) in samples)]
+
+
+def test_select_tier(pscu):
+    """Test that the finest tier covering the start of a query is selected."""
+    trend = TrendHistory(pscu, ["temp1"], TIERS)
+    record(trend, pscu, 200)
+
+    assert trend.query(start=1045.0)["period"] == 1
+    assert trend.query(start=1010.0)["period"] == 16
+    assert trend.query(start=900.0)["period"] == 16
+    assert trend.query(resolution=5)["period"] == 4
+    assert trend.query(start=1040.0, end=1042.0, resolution=1)["start"] == [1040.0, 1041.0, 1042.0]
+
+
+def test_query_unrecorded_signal(pscu):
+    """Test that a query of a signal not recorded in the trend history is rejected."""
+    trend = TrendHistory(pscu, ["temp1"], TIERS)
+
+    with pytest.raises(ValueError):
+        trend.query(names=["temp1_raw"])
+
+
+def test_bisect_times():
+    """Test that the binary search finds the first record at, or after, a timestamp."""
+    times = [1.0, 2.0, 2.0, 3.0]
+
+    assert bisect_times(times.__getitem__, 0, 4, 2.0) == 1
+    assert bisect_times(times.__getitem__, 0, 4, 2.0, after=True) == 3
+    assert bisect_times(times.__getitem__, 0, 4, 0.5) == 0
+    assert bisect_times(times.__getitem__, 0, 4, 5.0) == 4
+
+
+def test_ring_buffer_requires_time_at():
+    """Test that a ring buffer must give the timestamps of its records."""
+    with pytest.raises(TypeError):
+        RingBuffer(4)